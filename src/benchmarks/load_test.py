@@ -0,0 +1,287 @@
+# End-to-end load test of the catch loop. Simulates N players each running the
+# client loop: register and login once, then every few seconds upload a
+# location, fetch nearby players, select one of them now and then, check the
+# selection and fetch the leaderboard.
+#
+# By default the app runs in this process over ASGI, with the in-memory
+# database and the local LLM unless MONGODB_BACKEND / LLM_PROVIDER say
+# otherwise, so tracker ticks are timed as well. Pass --base-url to load a
+# running server instead (tick durations are then not available).
+#
+# Run from `src/` with `python -m benchmarks.load_test --players 200 --duration 60`.
+# Results are written as JSON (--output) to compare across commits.
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+# Roughly the middle of Monash Clayton.
+CENTER = (-37.9105, 145.1335)
+# Players start within about +-300m of the centre and walk around.
+SPREAD = 0.003
+STEP = 0.00005
+
+
+class Recorder():
+    """
+    Latencies and status codes per endpoint, keyed by route template.
+    """
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def request(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        statuses = self.statuses.setdefault(endpoint, {})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return response
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            endpoint: {
+                "requests": len(latencies),
+                "throughput": len(latencies) / elapsed,
+                **percentiles(latencies),
+                "statuses": {str(status): count for status, count in sorted(self.statuses[endpoint].items())},
+                "errors": self.errors.get(endpoint, 0),
+            }
+            for endpoint, latencies in sorted(self.latencies.items())
+        }
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+
+    values = sorted(values)
+
+    def at(q: float) -> float:
+        return values[min(len(values) - 1, math.ceil(q * len(values)) - 1)]
+
+    return {
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "mean": statistics.fmean(values),
+        "max": values[-1],
+    }
+
+
+def data(response: httpx.Response) -> dict | list:
+    body = response.json()
+    # Everything but /auth/login is wrapped by ResponseWrapperMiddleware.
+    return body["data"] if isinstance(body, dict) and "data" in body else body
+
+
+class Player():
+    def __init__(self, index: int, run_id: str, rng: random.Random):
+        self.name = f"load-{run_id}-{index}"
+        self.password = "load-test"
+        self.rng = rng
+        self.lat = CENTER[0] + rng.uniform(-SPREAD, SPREAD)
+        self.long = CENTER[1] + rng.uniform(-SPREAD, SPREAD)
+        self.id: str | None = None
+        self.headers: dict[str, str] = {}
+
+    async def setup(self, client: httpx.AsyncClient, recorder: Recorder) -> bool:
+        response = await recorder.request(
+            client, "POST /auth/register", "POST", "/auth/register",
+            params={"username": self.name, "password": self.password},
+            json=[{"id": question, "answer": f"{self.name} answer {question}"} for question in (0, 3, 5)],
+        )
+        if response is None or response.status_code != 200:
+            return False
+        self.id = data(response)["user"]["id"]
+
+        response = await recorder.request(
+            client, "POST /auth/login", "POST", "/auth/login",
+            data={"username": self.name, "password": self.password},
+        )
+        if response is None or response.status_code != 200:
+            return False
+        self.headers = {"Authorization": f"Bearer {data(response)['access_token']}"}
+        return True
+
+    async def iteration(self, client: httpx.AsyncClient, recorder: Recorder, radius: float, select_probability: float) -> None:
+        self.lat += self.rng.uniform(-STEP, STEP)
+        self.long += self.rng.uniform(-STEP, STEP)
+
+        await recorder.request(
+            client, "POST /location/upload/", "POST", "/location/upload/",
+            params={"latitude": self.lat, "longitude": self.long}, headers=self.headers,
+        )
+        response = await recorder.request(
+            client, "GET /location/radius-fetch/{user_id}", "GET", f"/location/radius-fetch/{self.id}",
+            params={"radius": radius},
+        )
+        nearby = data(response) if response is not None and response.status_code == 200 else []
+
+        if nearby and self.rng.random() < select_probability:
+            other = self.rng.choice(nearby)
+            await recorder.request(
+                client, "POST /friendex/select/{user_id}", "POST", f"/friendex/select/{other['id']}", headers=self.headers,
+            )
+
+        await recorder.request(client, "GET /friendex/select/check", "GET", "/friendex/select/check", headers=self.headers)
+        await recorder.request(client, "GET /leaderboard/", "GET", "/leaderboard/", params={"size": 10})
+
+
+async def run_player(player: Player, client: httpx.AsyncClient, recorder: Recorder, args: argparse.Namespace, deadline: float) -> None:
+    # Spread the first iterations so players don't move in lockstep.
+    await asyncio.sleep(player.rng.uniform(0, args.interval))
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await player.iteration(client, recorder, args.radius, args.select_probability)
+        await asyncio.sleep(max(0.0, args.interval - (time.perf_counter() - started)))
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    started_at = datetime.now(timezone.utc)
+    rng = random.Random(args.seed)
+    run_id = f"{int(time.time())}-{rng.randrange(10**6)}"
+    tick_durations: list[float] = []
+
+    app = None
+    if args.base_url is None:
+        os.environ.setdefault("MONGODB_BACKEND", "memory")
+        os.environ.setdefault("LLM_PROVIDER", "local")
+        os.environ.setdefault("JWT_SECRET_KEY", "load-test")
+
+        import config
+        import main
+
+        # Time every tick of the real tracker loop.
+        tracker = config.tracker
+        on_tick = tracker.on_tick
+
+        async def timed_tick(scale: float = 1) -> None:
+            start = time.perf_counter()
+            try:
+                await on_tick(scale)
+            finally:
+                tick_durations.append(time.perf_counter() - start)
+
+        tracker.on_tick = timed_tick
+        app = main.app
+        await app.router.startup()
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+
+    recorder = Recorder()
+    try:
+        players = [Player(i, run_id, random.Random(rng.random())) for i in range(args.players)]
+
+        setup_start = time.perf_counter()
+        semaphore = asyncio.Semaphore(args.setup_concurrency)
+
+        async def setup(player: Player) -> bool:
+            async with semaphore:
+                return await player.setup(client, recorder)
+
+        ready = await asyncio.gather(*(setup(player) for player in players))
+        players = [player for player, ok in zip(players, ready) if ok]
+        setup_elapsed = time.perf_counter() - setup_start
+
+        # Steady state only, registration and login are reported separately.
+        setup_recorder, recorder = recorder, Recorder()
+        start = time.perf_counter()
+        await asyncio.gather(*(run_player(player, client, recorder, args, start + args.duration) for player in players))
+        elapsed = time.perf_counter() - start
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    return {
+        "commit": git_commit(),
+        "started_at": started_at.isoformat(),
+        "target": args.base_url or "in-process",
+        "backend": os.getenv("MONGODB_BACKEND", "mongo") if args.base_url is None else None,
+        "parameters": {
+            "players": args.players,
+            "duration": args.duration,
+            "interval": args.interval,
+            "radius": args.radius,
+            "select_probability": args.select_probability,
+            "seed": args.seed,
+        },
+        "setup": {"players_ready": len(players), "elapsed": setup_elapsed, "endpoints": setup_recorder.summary(setup_elapsed)},
+        "elapsed": elapsed,
+        "requests": total,
+        "throughput": total / elapsed,
+        "endpoints": recorder.summary(elapsed),
+        "ticks": {"count": len(tick_durations), **percentiles(tick_durations)} if args.base_url is None else None,
+    }
+
+
+def print_report(result: dict) -> None:
+    print(
+        f"{result['setup']['players_ready']} players, {result['elapsed']:.1f}s, "
+        f"{result['requests']} requests ({result['throughput']:.1f}/s) against {result['target']}"
+    )
+    print(f"{'endpoint':<40} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for endpoint, stats in result["endpoints"].items():
+        print(
+            f"{endpoint:<40} {stats['throughput']:>8.1f} {stats['p50'] * 1000:>8.1f} "
+            f"{stats['p95'] * 1000:>8.1f} {stats['p99'] * 1000:>8.1f}  {stats['statuses']}"
+        )
+
+    ticks = result["ticks"]
+    if ticks and ticks["count"]:
+        print(f"tracker ticks: {ticks['count']}, p50 {ticks['p50'] * 1000:.2f}ms, p99 {ticks['p99'] * 1000:.2f}ms, max {ticks['max'] * 1000:.2f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end HTTP load test of the catch loop")
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of steady-state load after setup")
+    parser.add_argument("--interval", type=float, default=3.0, help="Seconds between two iterations of a player")
+    parser.add_argument("--radius", type=float, default=0.05, help="Radius-fetch radius in km")
+    parser.add_argument("--select-probability", type=float, default=0.1)
+    parser.add_argument("--setup-concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--base-url", default=None, help="Load a running server instead of the in-process app")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
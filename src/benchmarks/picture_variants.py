@@ -0,0 +1,62 @@
+# Measures the picture bytes a client downloads to render one leaderboard page,
+# using full-size profile pictures (as before variants existed) versus each
+# thumbnail size, plus how long generating the variants takes.
+#
+# Run from `src/` with `python -m benchmarks.picture_variants`.
+
+import argparse
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from modules.thumbnails import THUMBNAIL_SIZES, make_thumbnails
+
+
+# Photo-like picture: smooth gradients with some noise, so it compresses like a
+# camera image rather than a flat colour.
+def make_picture(rng: np.random.Generator, size: int, format: str) -> bytes:
+    y, x = np.mgrid[0:size, 0:size] / size
+    phase = rng.uniform(0, 2 * np.pi, 3)
+    channels = [
+        127 + 100 * np.sin(6 * x + phase[i]) * np.cos(4 * y - phase[i]) + rng.normal(0, 12, (size, size))
+        for i in range(3)
+    ]
+    pixels = np.clip(np.stack(channels, axis=-1), 0, 255).astype(np.uint8)
+
+    output = BytesIO()
+    Image.fromarray(pixels).save(output, format=format, **({"quality": 90} if format == "JPEG" else {}))
+    return output.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profile picture variant benchmark")
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 25, 50])
+    parser.add_argument("--picture-size", type=int, default=1024, help="Side of the uploaded pictures in pixels")
+    parser.add_argument("--format", choices=["JPEG", "PNG"], default="JPEG")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    users = max(args.page_sizes)
+    pictures = [make_picture(rng, args.picture_size, args.format) for _ in range(users)]
+
+    start = time.perf_counter()
+    variants = [make_thumbnails(picture) for picture in pictures]
+    generation = (time.perf_counter() - start) / users
+
+    print(f"{users} {args.picture_size}px {args.format} pictures, {generation * 1000:.1f}ms per picture to generate {len(THUMBNAIL_SIZES)} variants")
+    header = f"{'page':>6} {'original':>12}" + "".join(f" {f'size={size}':>12}" for size in THUMBNAIL_SIZES)
+    print(header)
+    for page in args.page_sizes:
+        original = sum(len(picture) for picture in pictures[:page])
+        row = f"{page:>6} {original:>12,}"
+        for size in THUMBNAIL_SIZES:
+            served = sum(len(variant.get(size, picture)) for variant, picture in zip(variants[:page], pictures[:page]))
+            row += f" {served:>12,}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Compares the grid-indexed radius lookup used by `/location/radius-fetch` with
+# the previous linear scan over every online player.
+#
+# Run from `src/` with `python -m benchmarks.radius_fetch`.
+
+import argparse
+import random
+import time
+
+from modules.friendex.spatial import haversine
+from modules.friendex.tracker import PlayersTracker
+
+# Roughly the middle of Monash Clayton.
+CENTER = (-37.9105, 145.1335)
+# Players are spread over about +-1.1km around the centre.
+SPREAD = 0.01
+
+
+def populate(tracker: PlayersTracker, players: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    ids = [f"player-{i}" for i in range(players)]
+    for id in ids:
+        tracker.update_location(
+            id,
+            CENTER[0] + rng.uniform(-SPREAD, SPREAD),
+            CENTER[1] + rng.uniform(-SPREAD, SPREAD),
+        )
+
+    return ids
+
+
+# The lookup `fetch_radius` did before the grid index existed.
+def linear_scan(tracker: PlayersTracker, lat: float, long: float, radius: float) -> dict[str, tuple[float, float]]:
+    location_table = {}
+    for user_id, (other_lat, other_long, _) in tracker.locations.items():
+        location_table[user_id] = (other_lat, other_long)
+
+    nearby = {}
+    for table_id, table_coords in location_table.items():
+        if haversine((lat, long), table_coords) <= radius:
+            nearby[table_id] = table_coords
+
+    return nearby
+
+
+def grid_lookup(tracker: PlayersTracker, lat: float, long: float, radius: float) -> dict[str, tuple[float, float]]:
+    return tracker.get_locations_within(lat, long, radius)
+
+
+def time_queries(func, tracker: PlayersTracker, queries: list[str], radius: float) -> float:
+    start = time.perf_counter()
+    for id in queries:
+        lat, long, _ = tracker.locations[id]
+        func(tracker, lat, long, radius)
+
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Radius-fetch lookup benchmark")
+    parser.add_argument("--players", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--radius", type=float, default=0.1, help="Query radius in km")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'players':>9} {'linear (ms)':>12} {'grid (ms)':>10} {'speedup':>8} {'matches':>8}")
+    for players in args.players:
+        tracker = PlayersTracker()
+        ids = populate(tracker, players, args.seed)
+        queries = random.Random(args.seed + 1).sample(ids, min(args.queries, players))
+
+        # Sanity check both lookups agree before timing them.
+        for id in queries[:10]:
+            lat, long, _ = tracker.locations[id]
+            assert linear_scan(tracker, lat, long, args.radius).keys() == grid_lookup(tracker, lat, long, args.radius).keys()
+
+        lat, long, _ = tracker.locations[queries[0]]
+        matches = len(grid_lookup(tracker, lat, long, args.radius))
+
+        linear = time_queries(linear_scan, tracker, queries, args.radius)
+        grid = time_queries(grid_lookup, tracker, queries, args.radius)
+        print(f"{players:>9} {linear * 1000:>12.3f} {grid * 1000:>10.3f} {linear / grid:>7.1f}x {matches:>8}")
+
+
+if __name__ == "__main__":
+    main()
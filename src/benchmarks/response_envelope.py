@@ -0,0 +1,135 @@
+# Measures the per-request overhead of ResponseWrapperMiddleware compared with
+# the previous BaseHTTPMiddleware implementation, which buffered the body,
+# decoded it and re-encoded the envelope with JSONResponse.
+#
+# Run from `src/` with `python -m benchmarks.response_envelope`.
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+
+from web.middlewares.general import ResponseWrapperMiddleware
+
+
+# The middleware as it was before it became pure ASGI, kept here as the baseline.
+class LegacyResponseWrapperMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):
+        if request.url.path.startswith(("/docs", "/redoc", "/openapi.json")):
+            return await call_next(request)
+
+        response = await call_next(request)
+
+        if request.url.path.startswith("/auth/login"):
+            return response
+
+        body = b""
+        async for chunk in response.body_iterator:
+            body += chunk
+
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            return response
+
+        return JSONResponse(
+            content={"status": "success" if response.status_code == 200 else "failed", "data": payload},
+            status_code=response.status_code,
+        )
+
+
+# Roughly the shape of a user returned by the friendex/leaderboard routes.
+def make_payload(size: int) -> list[dict]:
+    user = {
+        "_id": "7c0c6a36-8b0c-4f43-9a53-4d1c8f3c2f11",
+        "name": "someone",
+        "points": 120,
+        "questions_answered": 4,
+        "disabled": False,
+        "questions": [{"id": i, "answer": "an answer of a reasonable length"} for i in range(3)],
+        "friends": ["0d2b4f6e-1c5a-4a8e-9a4b-5e0f7a2c9d13"] * 3,
+        "selected_friend": None,
+        "achievements": [],
+    }
+    per_user = len(json.dumps(user))
+
+    return [user] * max(1, size // per_user)
+
+
+def make_app(middleware: type | None, payloads: dict[str, bytes]) -> FastAPI:
+    app = FastAPI()
+    if middleware is not None:
+        app.add_middleware(middleware)
+
+    for name, body in payloads.items():
+        # Serve pre-encoded JSON so only the middleware cost differs between runs.
+        async def endpoint(body: bytes = body):
+            return _RawJSONResponse(body)
+
+        app.add_api_route(f"/{name}", endpoint, methods=["GET"])
+
+    return app
+
+
+class _RawJSONResponse(JSONResponse):
+    def __init__(self, body: bytes):
+        super().__init__(content=None)
+        self.body = body
+        self.init_headers()
+
+    def render(self, content) -> bytes:
+        return b""
+
+
+async def time_requests(app: FastAPI, path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up routing and the transport before timing.
+        response = await client.get(path)
+        response.raise_for_status()
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            await client.get(path)
+
+        return (time.perf_counter() - start) / requests
+
+
+async def run(sizes: list[int], requests: int) -> None:
+    payloads = {f"payload_{size}": json.dumps(make_payload(size)).encode() for size in sizes}
+
+    apps = {
+        "none": make_app(None, payloads),
+        "legacy": make_app(LegacyResponseWrapperMiddleware, payloads),
+        "asgi": make_app(ResponseWrapperMiddleware, payloads),
+    }
+
+    print(f"{'payload':>12} {'bare (ms)':>10} {'legacy +ms':>11} {'asgi +ms':>9}")
+    for name, body in payloads.items():
+        # Fewer iterations for multi-megabyte bodies keeps the run short.
+        count = max(5, requests * 1000 // max(1000, len(body) // 1000))
+        count = min(count, requests)
+        timings = {label: await time_requests(app, f"/{name}", count) for label, app in apps.items()}
+        bare = timings["none"]
+        print(
+            f"{len(body):>12} {bare * 1000:>10.3f} "
+            f"{(timings['legacy'] - bare) * 1000:>11.3f} {(timings['asgi'] - bare) * 1000:>9.3f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Response envelope middleware benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 1_000_000, 4_000_000], help="Approximate payload sizes in bytes")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.sizes, args.requests))
+
+
+if __name__ == "__main__":
+    main()
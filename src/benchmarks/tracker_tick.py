@@ -0,0 +1,263 @@
+# Drives PlayersTracker.on_tick in isolation on synthetic populations clustered
+# around the classrooms of CLASSROOM_LOCATIONS, against a stub collection, and
+# reports tick time, allocations (tracemalloc) and a cProfile breakdown.
+#
+# Run from `src/` with `python -m benchmarks.tracker_tick --players 1000 10000 100000`.
+# Pass --output to write the results as JSON to compare across commits.
+
+import argparse
+import asyncio
+import cProfile
+import io
+import json
+import math
+import pstats
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import config
+from modules.friendex.locations import CLASSROOM_LOCATIONS
+from modules.friendex.spatial import KM_PER_DEGREE
+from modules.friendex.tracker import LOCATION_TTL, TRACKING_EXPIRY, PlayersTracker
+from modules.points import PointsBuffer
+
+
+class StubResult():
+    matched_count = 0
+    modified_count = 0
+    deleted_count = 0
+
+
+class StubCollection():
+    """
+    Accepts every write the tracker makes without doing any I/O, counting them.
+    """
+
+    def __init__(self):
+        self.calls: dict[str, int] = {}
+        self.operations = 0
+
+    def _record(self, name: str, operations: int = 1) -> StubResult:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.operations += operations
+        return StubResult()
+
+    async def bulk_write(self, operations: list, ordered: bool = True) -> StubResult:
+        return self._record("bulk_write", len(operations))
+
+    async def update_many(self, query: dict, update: dict) -> StubResult:
+        return self._record("update_many")
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False) -> StubResult:
+        return self._record("update_one")
+
+
+class StubDB():
+    def __init__(self):
+        self.collection = StubCollection()
+
+    async def get_collection(self, collection: str) -> StubCollection:
+        return self.collection
+
+
+# Random point around a classroom, normally distributed with its radius as the
+# standard deviation
+def _around_classroom(rng: random.Random) -> tuple[float, float]:
+    classroom = rng.choice(CLASSROOM_LOCATIONS)
+    lat, long = classroom["coords"]
+    sigma = classroom["radius"] / 1000 / KM_PER_DEGREE
+    return (
+        lat + rng.gauss(0, sigma),
+        long + rng.gauss(0, sigma / math.cos(math.radians(lat))),
+    )
+
+
+# Fill a fresh tracker with 'players' locations and tracking pairs between
+# 'pair_fraction' of them. 'colocated' of the pairs stand next to each other,
+# 'stale_locations' of the locations and 'expired_pairs' of the pairs are due to
+# be removed by the next cleanup.
+def build_tracker(
+    players: int,
+    pair_fraction: float,
+    colocated: float,
+    stale_locations: float,
+    expired_pairs: float,
+    seed: int,
+) -> PlayersTracker:
+    rng = random.Random(seed)
+    tracker = PlayersTracker()
+    now = datetime.now(timezone.utc)
+    stale_at = now - timedelta(seconds=2 * LOCATION_TTL)
+
+    ids = [f"player-{i}" for i in range(players)]
+    positions = {id: _around_classroom(rng) for id in ids}
+
+    paired = ids[:int(players * pair_fraction) // 2 * 2]
+    for id_1, id_2 in zip(paired[::2], paired[1::2]):
+        if rng.random() < colocated:
+            lat, long = positions[id_1]
+            # Within a few metres of each other.
+            positions[id_2] = (lat + rng.uniform(-2e-5, 2e-5), long + rng.uniform(-2e-5, 2e-5))
+
+        tracker.add_tracking(id_1, id_2)
+        if rng.random() < expired_pairs:
+            tracking = tracker.get_player_tracking(id_1)
+            tracking.created_at = now - TRACKING_EXPIRY - timedelta(seconds=1)
+            tracker.tracking_expiry.push(tracking.created_at + TRACKING_EXPIRY, (id_1, id_2), tracking)
+
+    for id, (lat, long) in positions.items():
+        tracker.update_location(id, lat, long)
+        if rng.random() < stale_locations:
+            tracker.locations[id] = (lat, long, stale_at)
+            tracker.location_expiry.push(stale_at + timedelta(seconds=LOCATION_TTL), id, stale_at)
+
+    return tracker
+
+
+def summarize(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "min": values[0],
+        "median": statistics.median(values),
+        "p95": values[min(len(values) - 1, math.ceil(0.95 * len(values)) - 1)],
+        "max": values[-1],
+        "mean": statistics.fmean(values),
+    }
+
+
+async def bench_population(args: argparse.Namespace, players: int) -> dict:
+    def build(repeat: int) -> PlayersTracker:
+        return build_tracker(
+            players, args.pair_fraction, args.colocated, args.stale_locations, args.expired_pairs, args.seed + repeat
+        )
+
+    tick_times = []
+    cleanup_times = []
+    stats = {}
+    for repeat in range(args.repeats):
+        tracker = build(repeat)
+        cleanup = tracker.cleanup
+
+        async def timed_cleanup() -> None:
+            start = time.perf_counter()
+            await cleanup()
+            cleanup_times.append(time.perf_counter() - start)
+
+        tracker.cleanup = timed_cleanup
+        start = time.perf_counter()
+        await tracker.on_tick()
+        tick_times.append(time.perf_counter() - start)
+        stats = {
+            "locations_after": len(tracker.locations),
+            "pairs_after": len(tracker.currently_tracking),
+            "awarded_users": tracker.last_flush.operations,
+            "awarded_points": tracker.last_flush.points,
+        }
+
+    # Allocations of one more tick, on its own so tracing doesn't skew timings.
+    tracker = build(args.repeats)
+    tracemalloc.start(args.traceback_depth)
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    await tracker.on_tick()
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocations = [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size": stat.size_diff,
+            "count": stat.count_diff,
+        }
+        for stat in after.compare_to(before, "lineno")[:args.top]
+    ]
+
+    # Same for the profile.
+    tracker = build(args.repeats + 1)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    await tracker.on_tick()
+    profiler.disable()
+    profile = pstats.Stats(profiler, stream=io.StringIO())
+    functions = sorted(profile.stats.items(), key=lambda item: item[1][3], reverse=True)
+    breakdown = [
+        {
+            "function": f"{filename}:{lineno}({name})",
+            "calls": calls,
+            "tottime": tottime,
+            "cumtime": cumtime,
+        }
+        for (filename, lineno, name), (_, calls, tottime, cumtime, _) in functions[:args.top]
+    ]
+
+    return {
+        "players": players,
+        "pairs": int(players * args.pair_fraction) // 2,
+        "tick": summarize(tick_times),
+        "cleanup": summarize(cleanup_times),
+        **stats,
+        "allocations": {"peak": peak, "retained": current, "top": allocations},
+        "profile": breakdown,
+    }
+
+
+def print_report(result: dict) -> None:
+    tick, cleanup = result["tick"], result["cleanup"]
+    print(
+        f"{result['players']:>7} players {result['pairs']:>6} pairs | tick median {tick['median'] * 1000:8.2f}ms "
+        f"max {tick['max'] * 1000:8.2f}ms | cleanup median {cleanup['median'] * 1000:7.2f}ms | "
+        f"peak alloc {result['allocations']['peak'] / 1024:8.0f}KiB | awarded {result['awarded_users']} user(s)"
+    )
+    for entry in result["profile"][:5]:
+        print(f"        {entry['cumtime'] * 1000:8.2f}ms cum {entry['tottime'] * 1000:8.2f}ms own {entry['calls']:>8} calls  {entry['function']}")
+
+
+async def run(args: argparse.Namespace) -> dict:
+    config.db = StubDB()
+    # Awards are only buffered during a tick, and never journaled here.
+    config.points = PointsBuffer(journal_path=None)
+    results = []
+    for players in args.players:
+        result = await bench_population(args, players)
+        print_report(result)
+        results.append(result)
+
+    return {
+        "parameters": {
+            "pair_fraction": args.pair_fraction,
+            "colocated": args.colocated,
+            "stale_locations": args.stale_locations,
+            "expired_pairs": args.expired_pairs,
+            "repeats": args.repeats,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Synthetic PlayersTracker tick benchmark and profiler")
+    parser.add_argument("--players", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--pair-fraction", type=float, default=0.5, help="Fraction of players in a tracking pair")
+    parser.add_argument("--colocated", type=float, default=0.5, help="Fraction of pairs standing next to each other")
+    parser.add_argument("--stale-locations", type=float, default=0.05, help="Fraction of locations expiring on the tick")
+    parser.add_argument("--expired-pairs", type=float, default=0.01, help="Fraction of pairs expiring on the tick")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20, help="Number of profile and allocation entries to keep")
+    parser.add_argument("--traceback-depth", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,15 +8,30 @@ from modules.db import MongoClient
 
 if TYPE_CHECKING:
     from fastapi import FastAPI
-    from groq import AsyncGroq
 
     from models.config_models import AppConfigDto
+    from modules.cache import TTLCache
     from modules.friendex.tracker import PlayersTracker
+    from modules.leaderboard import Leaderboard
+    from modules.llm import LLMProvider
+    from modules.mcq_cache import MCQCache
+    from modules.points import PointsBuffer
+    from modules.questions.prefetch import MCQPrefetcher
 
 
 app: FastAPI = None
 app_config: AppConfigDto = None
 # TODO: Add MongoDB connection type hint below.
 db: MongoClient = None
-groq: AsyncGroq = None
+# Chat completion backend, selected with LLM_PROVIDER.
+llm: LLMProvider = None
 tracker: PlayersTracker = None
+# Validated users keyed by token subject, see web.auth.user_auth.get_current_user.
+user_cache: TTLCache = None
+leaderboard: Leaderboard = None
+# Generated MCQs, see modules.mcq_cache.
+mcq_cache: MCQCache = None
+# Write-behind buffer every points award goes through.
+points: PointsBuffer = None
+# MCQs generated in the background for tracked pairs.
+mcq_prefetcher: MCQPrefetcher = None
@@ -3,19 +3,27 @@ import importlib
 import logging
 import os
 import yaml
-import httpx
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
-from groq import AsyncGroq
 
 # from fastapi.middleware.cors import CORSMiddleware
 from typing import TYPE_CHECKING
 
 import config
+from modules.cache import TTLCache
 from modules.friendex.tracker import PlayersTracker
-from modules.db import MongoClient
+from modules.db import create_client
+from modules.db.indexes import ensure_indexes
+from modules.leaderboard import Leaderboard
+from modules.llm import create_provider
+from modules.mcq_cache import MCQCache
+from modules.points import PointsBuffer
+from modules.questions.prefetch import MCQPrefetcher
+from modules.picture_store import thumbnail_pool
+from web.auth.user_auth import USER_CACHE_SIZE, USER_CACHE_TTL, password_pool
 from web.middlewares.general import ResponseWrapperMiddleware
+from web.middlewares.metrics import MetricsMiddleware
 
 if TYPE_CHECKING:
     from fastapi import APIRouter
@@ -26,6 +34,8 @@ app = FastAPI()
 config.app = app
 
 app.add_middleware(ResponseWrapperMiddleware)
+# Added last so it is the outermost middleware and sees the final response.
+app.add_middleware(MetricsMiddleware)
 
 _log = logging.getLogger("uvicorn")
 load_dotenv()
@@ -81,12 +91,30 @@ _log.setLevel(logging.DEBUG)
 _get_config()
 _import_routers()
 
-config.db = MongoClient()
-config.groq = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), timeout=httpx.Timeout(60.0, read=5.0, write=10.0, connect=2.0))
+config.db = create_client()
+config.llm = create_provider()
 config.tracker = PlayersTracker()
+config.user_cache = TTLCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+config.leaderboard = Leaderboard()
+config.mcq_cache = MCQCache()
+config.points = PointsBuffer.from_env("POINTS")
+config.mcq_prefetcher = MCQPrefetcher()
 
 @app.on_event("startup")
 async def startup_event():
+    await ensure_indexes(config.db)
+    # Before the leaderboard is seeded, so it sees the replayed points.
+    await config.points.replay()
     await config.tracker.populate()
+    await config.leaderboard.populate()
     asyncio.create_task(config.tracker.start_loop())
+    asyncio.create_task(config.points.start_loop())
     _log.info("App initialized")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    password_pool.shutdown()
+    thumbnail_pool.shutdown()
+    await config.points.close()
+    await config.llm.close()
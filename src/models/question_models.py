@@ -4,3 +4,14 @@ from pydantic import BaseModel
 class QuestionDto(BaseModel):
     id: int
     answer: str
+
+
+class UserQuestionnaireAnswer(BaseModel):
+    id: int
+    answerText: str
+
+
+class UserQuestionnaireMCQ(BaseModel):
+    id: int
+    questionText: str
+    options: list[UserQuestionnaireAnswer]
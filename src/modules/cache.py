@@ -0,0 +1,107 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache():
+    """
+    Bounded LRU cache whose entries also expire 'ttl' seconds after being set.
+
+    Values loaded with an await in between can be stored with the `generation`
+    read before the load, so a value read before an invalidation of its key
+    isn't cached over the newer data.
+
+    Not thread safe; meant to be used from the event loop only.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Incremented by every invalidation. The generation of the latest
+        # invalidation of the last 'max_size' invalidated keys is kept, and
+        # 'forgotten' is the newest one dropped from it.
+        self.generation = 0
+        self._invalidated: OrderedDict[Hashable, int] = OrderedDict()
+        self._forgotten = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    # Returns the cached value, or 'default' if missing or expired
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    # Cache 'value'. If 'generation' is given, the value is dropped when 'key'
+    # may have been invalidated after that generation was read.
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        if generation is not None and (self._invalidated.get(key, 0) > generation or self._forgotten > generation):
+            self.stale_sets += 1
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys: Hashable) -> None:
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+            self.generation += 1
+            self._invalidated[key] = self.generation
+            self._invalidated.move_to_end(key)
+            if len(self._invalidated) > self.max_size:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+
+    # Drop every entry for which predicate(key, value) is true. O(n), meant for
+    # rare invalidations that can't be expressed as a list of keys.
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        keys = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+        self.invalidate(*keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_sets": self.stale_sets,
+        }
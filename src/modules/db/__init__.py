@@ -8,7 +8,9 @@ from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
 from .collections import CollectionRef
 from .users import UserRef
 from .locations import LocationRef
-from .pictures import PictureRef
+from .mcq import MCQCacheRef
+from .pictures import PictureChunkRef, PictureRef
+from .monitoring import CommandMonitor
 
 __all__ = ["UserRef", "CollectionRef", "LocationRef"]
 
@@ -18,8 +20,24 @@ _log = logging.getLogger("uvicorn")
 class MongoClient:
     def __init__(self, uri: str = None):
         uri = uri if uri is not None else os.getenv("MONGODB_URI") # f"mongodb://{os.getenv('MONGO_USER')}:{os.getenv('MONGO_PASSWORD')}@{os.getenv('MONGO_HOST')}:{os.getenv('MONGO_PORT')}"
-        self.client = AsyncIOMotorClient(uri)
+        # Records every command, see stats() and the mongodb_* metrics.
+        self.monitor = CommandMonitor()
+        self.client = AsyncIOMotorClient(uri, event_listeners=[self.monitor])
         self.db = self.client.get_database(os.getenv("MONGODB_DATABASE"))
 
     async def get_collection(self, collection: str) -> AsyncIOMotorCollection:
         return self.db[collection]
+
+
+# Create the client of the backend named by MONGODB_BACKEND: "mongo" (default)
+# or "memory" for the in-process store of modules.db.memory
+def create_client() -> MongoClient:
+    backend = os.getenv("MONGODB_BACKEND", "mongo")
+    if backend == "memory":
+        from .memory import MemoryClient
+
+        return MemoryClient()
+    if backend != "mongo":
+        raise ValueError(f"Unknown database backend '{backend}', expected 'mongo' or 'memory'")
+
+    return MongoClient()
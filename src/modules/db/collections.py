@@ -5,3 +5,5 @@ class CollectionRef(StrEnum):
     USERS = "users"
     LOCATIONS = "locations"
     PICTURES = "pictures"
+    PICTURE_CHUNKS = "picture_chunks"
+    MCQ_CACHE = "mcq_cache"
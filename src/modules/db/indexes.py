@@ -0,0 +1,180 @@
+# Declarative registry of the indexes every collection needs, applied on startup.
+#
+# `python -m modules.db.indexes --verify` (from `src/`, against the mongod in
+# MONGODB_URI) applies the indexes, runs `explain` on the query shape of every
+# route in QUERY_SHAPES and exits non-zero if any of them plans a COLLSCAN.
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from pymongo import ASCENDING, IndexModel
+from typing import TYPE_CHECKING
+
+from .collections import CollectionRef
+from .mcq import MCQCacheRef
+from .pictures import PictureChunkRef, PictureRef
+from .users import UserRef
+
+if TYPE_CHECKING:
+    from . import MongoClient
+
+_log = logging.getLogger("uvicorn")
+
+# Generated MCQs are dropped by mongod this long after being stored, so entries
+# for answers that no longer exist don't pile up.
+MCQ_CACHE_EXPIRE_AFTER = 30 * 24 * 60 * 60
+
+INDEXES: dict[CollectionRef, list[IndexModel]] = {
+    CollectionRef.USERS: [
+        # Login and register look users up by name.
+        IndexModel([(UserRef.NAME, ASCENDING)], name="name"),
+        # PlayersTracker.populate and delete_user.
+        IndexModel([(UserRef.SELECTED_FRIEND, ASCENDING)], name="selected_friend"),
+    ],
+    CollectionRef.PICTURES: [
+        IndexModel([(PictureRef.USER, ASCENDING)], name="user_id", unique=True),
+    ],
+    CollectionRef.PICTURE_CHUNKS: [
+        IndexModel(
+            [(PictureChunkRef.USER, ASCENDING), (PictureChunkRef.HASH, ASCENDING), (PictureChunkRef.N, ASCENDING)],
+            name="user_id_hash_n",
+            unique=True,
+        ),
+    ],
+    CollectionRef.MCQ_CACHE: [
+        # MCQCache.invalidate_user.
+        IndexModel([(MCQCacheRef.USER, ASCENDING)], name="user_id"),
+        IndexModel([(MCQCacheRef.CREATED, ASCENDING)], name="created_at", expireAfterSeconds=MCQ_CACHE_EXPIRE_AFTER),
+    ],
+}
+
+# Projection of the friendex listings, see web.routers.friendex_routes.
+_LISTING_PROJECTION = {UserRef.HASHED_PASSWORD: 0, UserRef.QUESTIONS: 0}
+
+# (description, explain command body) for the queries the routes and the tracker
+# run. Values are placeholders, only the shape matters.
+QUERY_SHAPES: list[tuple[str, dict]] = [
+    ("get_user by id", {"find": CollectionRef.USERS, "filter": {UserRef.ID: "id"}}),
+    ("login/register by name", {"find": CollectionRef.USERS, "filter": {UserRef.NAME: "name"}}),
+    ("friends by ids", {"find": CollectionRef.USERS, "filter": {UserRef.ID: {"$in": ["a", "b"]}}}),
+    (
+        "friends page",
+        {
+            "find": CollectionRef.USERS,
+            "filter": {UserRef.ID: {"$in": ["a", "b"], "$gt": "a"}},
+            "projection": _LISTING_PROJECTION,
+            "sort": {UserRef.ID: 1},
+            "limit": 100,
+        },
+    ),
+    (
+        "friends stream",
+        {"find": CollectionRef.USERS, "filter": {UserRef.ID: {"$in": ["a", "b"]}}, "projection": _LISTING_PROJECTION, "sort": {UserRef.ID: 1}},
+    ),
+    (
+        "unmet players page",
+        {
+            "find": CollectionRef.USERS,
+            "filter": {UserRef.ID: {"$nin": ["a", "b"], "$gt": "a"}},
+            "projection": _LISTING_PROJECTION,
+            "sort": {UserRef.ID: 1},
+            "limit": 100,
+        },
+    ),
+    (
+        "unmet players stream",
+        {"find": CollectionRef.USERS, "filter": {UserRef.ID: {"$nin": ["a", "b"]}}, "projection": _LISTING_PROJECTION, "sort": {UserRef.ID: 1}},
+    ),
+    ("leaderboard populate", {"find": CollectionRef.USERS, "filter": {}, "projection": {UserRef.HASHED_PASSWORD: 0}}),
+    ("tracker populate", {"find": CollectionRef.USERS, "filter": {UserRef.SELECTED_FRIEND: {"$ne": None}}}),
+    ("delete_user selected_friend", {"find": CollectionRef.USERS, "filter": {UserRef.SELECTED_FRIEND: "id"}}),
+    ("picture by user", {"find": CollectionRef.PICTURES, "filter": {PictureRef.USER: "id"}}),
+    ("picture by user and hash", {"find": CollectionRef.PICTURES, "filter": {PictureRef.USER: "id", PictureRef.HASH: "hash"}}),
+    (
+        "picture chunks",
+        {
+            "find": CollectionRef.PICTURE_CHUNKS,
+            "filter": {PictureChunkRef.USER: "id", PictureChunkRef.HASH: "hash"},
+            "sort": {PictureChunkRef.N: 1},
+        },
+    ),
+    (
+        "picture chunk gc",
+        {"find": CollectionRef.PICTURE_CHUNKS, "filter": {PictureChunkRef.USER: "id", PictureChunkRef.HASH: {"$in": ["a", "b"]}}},
+    ),
+    ("mcq cache by keys", {"find": CollectionRef.MCQ_CACHE, "filter": {MCQCacheRef.ID: {"$in": ["a", "b"]}}}),
+    ("mcq cache by user", {"find": CollectionRef.MCQ_CACHE, "filter": {MCQCacheRef.USER: "id"}}),
+]
+# Shapes that read every document on purpose, so their COLLSCAN is expected.
+FULL_SCAN_SHAPES = frozenset({"leaderboard populate"})
+
+
+# Create every registered index. Creating an index that already exists with the
+# same spec is a no-op, so this is safe to run on every startup.
+async def ensure_indexes(db: MongoClient) -> None:
+    for collection_ref, indexes in INDEXES.items():
+        collection = await db.get_collection(collection_ref)
+        try:
+            names = await collection.create_indexes(indexes)
+        except Exception:
+            _log.exception(f"Failed to create indexes on {collection_ref}")
+            continue
+
+        _log.info(f"Ensured indexes on {collection_ref}: {', '.join(names)}")
+
+
+def _plan_stages(plan: dict) -> list[str]:
+    stages = [plan["stage"]] if "stage" in plan else []
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            stages += _plan_stages(plan[child])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+
+    return stages
+
+
+# Returns the shapes whose winning plan contains an unexpected COLLSCAN, with
+# their stages
+async def find_collection_scans(db: MongoClient) -> list[tuple[str, list[str]]]:
+    offenders = []
+    for description, command in QUERY_SHAPES:
+        explained = await db.db.command("explain", command, verbosity="queryPlanner")
+        stages = _plan_stages(explained["queryPlanner"]["winningPlan"])
+        _log.info(f"{description}: {' <- '.join(stages)}")
+        if "COLLSCAN" in stages and description not in FULL_SCAN_SHAPES:
+            offenders.append((description, stages))
+
+    return offenders
+
+
+async def _main(verify: bool) -> int:
+    from dotenv import load_dotenv
+
+    from . import MongoClient
+
+    load_dotenv()
+    db = MongoClient()
+    await ensure_indexes(db)
+    if not verify:
+        return 0
+
+    offenders = await find_collection_scans(db)
+    for description, stages in offenders:
+        print(f"COLLSCAN: {description} ({' <- '.join(stages)})")
+
+    print(f"{len(QUERY_SHAPES) - len(offenders)}/{len(QUERY_SHAPES)} query shapes use an index")
+    return 1 if offenders else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply indexes and check query plans")
+    parser.add_argument("--verify", action="store_true", help="Fail if any registered query shape plans a COLLSCAN")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(args.verify)))
@@ -0,0 +1,10 @@
+from enum import StrEnum
+
+
+class MCQCacheRef(StrEnum):
+    # Hash of the prompt inputs, see modules.mcq_cache.MCQCache.make_key.
+    ID = "_id"
+    # User the question is about.
+    USER = "user_id"
+    MCQ = "mcq"
+    CREATED = "created_at"
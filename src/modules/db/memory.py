@@ -0,0 +1,551 @@
+# In-process stand-in for MongoClient, selected with MONGODB_BACKEND=memory.
+#
+# Implements the subset of the Motor collection API the app uses, so the whole
+# app can run without a mongod (load tests, profiling, quick local runs).
+# Nothing is persisted; every process starts with empty collections.
+
+import copy
+import logging
+from typing import Any, AsyncIterator, Iterable, Iterator
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, IndexModel, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+from .collections import CollectionRef
+from .users import UserRef
+
+_log = logging.getLogger("uvicorn")
+
+# Fields with a hash index from the start, on top of `_id`. Every index created
+# through create_indexes also hashes its leading field.
+HASHED_FIELDS: dict[str, tuple[str, ...]] = {
+    CollectionRef.USERS: (UserRef.NAME,),
+}
+
+_MISSING = object()
+
+
+def _get_path(document: dict, path: str) -> Any:
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_path(document: dict, path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+
+def _unset_path(document: dict, path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+
+# Orders values the way mongod does across types: null first, then numbers,
+# strings, documents, arrays, booleans and dates
+def _sort_key(value: Any) -> tuple:
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, dict):
+        return (3, str(value))
+    if isinstance(value, (list, tuple)):
+        return (4, [_sort_key(item) for item in value])
+    return (6, value)
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if expected is None:
+        return value is _MISSING or value is None
+    if value is _MISSING:
+        return False
+    # Like mongod, a scalar matches an array containing it.
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _compare(value: Any, expected: Any, operator: str) -> bool:
+    if value is _MISSING or value is None or expected is None:
+        return False
+    try:
+        if operator == "$gt":
+            return value > expected
+        if operator == "$gte":
+            return value >= expected
+        if operator == "$lt":
+            return value < expected
+        return value <= expected
+    except TypeError:
+        return False
+
+
+def _matches_condition(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+        return _equals(value, condition)
+
+    for operator, expected in condition.items():
+        if operator == "$eq":
+            matched = _equals(value, expected)
+        elif operator == "$ne":
+            matched = not _equals(value, expected)
+        elif operator == "$in":
+            matched = any(_equals(value, item) for item in expected)
+        elif operator == "$nin":
+            matched = not any(_equals(value, item) for item in expected)
+        elif operator in ("$gt", "$gte", "$lt", "$lte"):
+            matched = _compare(value, expected, operator)
+        elif operator == "$exists":
+            matched = (value is not _MISSING) == bool(expected)
+        else:
+            raise NotImplementedError(f"Query operator {operator} is not supported by the memory backend")
+
+        if not matched:
+            return False
+
+    return True
+
+
+def matches(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(document, sub_query) for sub_query in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(document, sub_query) for sub_query in condition):
+                return False
+        elif not _matches_condition(_get_path(document, key), condition):
+            return False
+
+    return True
+
+
+def project(document: dict, projection: dict | None) -> dict:
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    include_id = projection.get("_id", 1)
+    if any(fields.values()):
+        projected = {"_id": document["_id"]} if include_id and "_id" in document else {}
+        for path in fields:
+            value = _get_path(document, path)
+            if value is not _MISSING:
+                _set_path(projected, path, value)
+        return projected
+
+    for path in fields:
+        _unset_path(document, path)
+    if not include_id:
+        document.pop("_id", None)
+    return document
+
+
+def _apply_update(document: dict, update: dict) -> None:
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            if operator == "$set":
+                _set_path(document, path, copy.deepcopy(value))
+            elif operator == "$unset":
+                _unset_path(document, path)
+            elif operator == "$inc":
+                current = _get_path(document, path)
+                _set_path(document, path, (0 if current is _MISSING or current is None else current) + value)
+            elif operator in ("$push", "$addToSet"):
+                current = _get_path(document, path)
+                if current is _MISSING or current is None:
+                    current = []
+                    _set_path(document, path, current)
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for item in items:
+                    if operator == "$push" or item not in current:
+                        current.append(copy.deepcopy(item))
+            elif operator == "$pull":
+                current = _get_path(document, path)
+                if isinstance(current, list):
+                    current[:] = [item for item in current if not _matches_condition(item, value)]
+            else:
+                raise NotImplementedError(f"Update operator {operator} is not supported by the memory backend")
+
+
+def _sort(documents: list[dict], sort: list[tuple[str, int]]) -> list[dict]:
+    # Stable sorts from the least to the most significant field.
+    for field, direction in reversed(sort):
+        documents.sort(key=lambda document: _sort_key(_get_path(document, field)), reverse=direction < 0)
+    return documents
+
+
+def _normalize_sort(key: Any, direction: int | None = None) -> list[tuple[str, int]]:
+    if isinstance(key, str):
+        return [(key, direction if direction is not None else 1)]
+    if isinstance(key, dict):
+        return list(key.items())
+    return list(key)
+
+
+class MemoryCursor():
+    """
+    Lazily evaluated result of `find`/`aggregate`, supporting the chaining and
+    iteration of Motor cursors.
+    """
+
+    def __init__(self, documents: Iterable[dict], projection: dict | None = None):
+        self._source = documents
+        self._projection = projection
+        self._sort: list[tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: Iterator[dict] | None = None
+
+    def sort(self, key: Any, direction: int | None = None) -> "MemoryCursor":
+        self._sort = _normalize_sort(key, direction)
+        return self
+
+    def skip(self, skip: int) -> "MemoryCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "MemoryCursor":
+        return self
+
+    def _evaluate(self) -> Iterator[dict]:
+        documents = list(self._source)
+        if self._sort:
+            documents = _sort(documents, self._sort)
+        documents = documents[self._skip:]
+        if self._limit:
+            documents = documents[:self._limit]
+        return (project(document, self._projection) for document in documents)
+
+    def __aiter__(self) -> AsyncIterator[dict]:
+        return self
+
+    async def __anext__(self) -> dict:
+        if self._results is None:
+            self._results = self._evaluate()
+        try:
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+    async def to_list(self, length: int | None = None) -> list[dict]:
+        if self._results is None:
+            self._results = self._evaluate()
+
+        documents = []
+        for document in self._results:
+            documents.append(document)
+            if length is not None and len(documents) >= length:
+                break
+        return documents
+
+
+class MemoryCollection():
+    """
+    A collection held in a dict keyed by `_id`, with hash indexes (value ->
+    ids) on a few fields so equality lookups on them don't scan.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._documents: dict[Any, dict] = {}
+        self._hashed: dict[str, dict[Any, set]] = {}
+        self._index_names: list[str] = ["_id_"]
+        for field in HASHED_FIELDS.get(name, ()):
+            self._add_hash_index(field)
+
+    def _add_hash_index(self, field: str) -> None:
+        if field == "_id" or field in self._hashed:
+            return
+
+        index: dict[Any, set] = {}
+        for id, document in self._documents.items():
+            for key in self._keys(document, field):
+                index.setdefault(key, set()).add(id)
+        self._hashed[field] = index
+
+    @staticmethod
+    def _hash_key(value: Any) -> Any:
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return repr(value)
+
+    # Returns the hash keys of a document for 'field'. Arrays are indexed by
+    # each of their items, like a multikey index.
+    def _keys(self, document: dict, field: str) -> list:
+        value = _get_path(document, field)
+        if value is _MISSING:
+            return []
+        if isinstance(value, list):
+            return [self._hash_key(item) for item in value]
+        return [self._hash_key(value)]
+
+    def _index(self, document: dict) -> None:
+        for field, index in self._hashed.items():
+            for key in self._keys(document, field):
+                index.setdefault(key, set()).add(document["_id"])
+
+    def _unindex(self, document: dict) -> None:
+        for field, index in self._hashed.items():
+            for key in self._keys(document, field):
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(document["_id"])
+                    if not ids:
+                        del index[key]
+
+    # Returns the ids of the documents that can match 'query', using the _id
+    # or a hash index on an equality condition when there is one
+    def _candidates(self, query: dict) -> Iterable[Any]:
+        condition = query.get("_id", _MISSING)
+        if condition is not _MISSING:
+            if not isinstance(condition, dict):
+                return [condition] if condition in self._documents else []
+            if "$in" in condition:
+                return [id for id in dict.fromkeys(condition["$in"]) if id in self._documents]
+
+        for field, index in self._hashed.items():
+            condition = query.get(field, _MISSING)
+            if condition is _MISSING or condition is None or isinstance(condition, (dict, list)):
+                continue
+            return list(index.get(self._hash_key(condition), ()))
+
+        return list(self._documents)
+
+    def _matching(self, query: dict | None) -> Iterator[dict]:
+        query = query or {}
+        for id in self._candidates(query):
+            document = self._documents.get(id)
+            if document is not None and matches(document, query):
+                yield document
+
+    def _insert(self, document: dict) -> Any:
+        document = copy.deepcopy(document)
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} _id: {document['_id']!r}")
+
+        self._documents[document["_id"]] = document
+        self._index(document)
+        return document["_id"]
+
+    def _update(self, query: dict, update: dict, upsert: bool, many: bool) -> dict:
+        matched = 0
+        modified = 0
+        for document in list(self._matching(query)):
+            before = copy.deepcopy(document)
+            self._unindex(document)
+            _apply_update(document, update)
+            self._index(document)
+            matched += 1
+            modified += document != before
+            if not many:
+                break
+
+        upserted = None
+        if matched == 0 and upsert:
+            document = {
+                key: value for key, value in query.items()
+                if not key.startswith("$") and not (isinstance(value, dict) and any(k.startswith("$") for k in value))
+            }
+            _apply_update(document, update)
+            upserted = self._insert(document)
+
+        return {"n": matched + (upserted is not None), "nModified": modified, "upserted": upserted}
+
+    def _replace(self, query: dict, replacement: dict, upsert: bool) -> dict:
+        for document in self._matching(query):
+            replacement = copy.deepcopy(replacement)
+            replacement["_id"] = document["_id"]
+            self._unindex(document)
+            self._documents[document["_id"]] = replacement
+            self._index(replacement)
+            return {"n": 1, "nModified": int(replacement != document), "upserted": None}
+
+        if upsert:
+            return {"n": 1, "nModified": 0, "upserted": self._insert(replacement)}
+        return {"n": 0, "nModified": 0, "upserted": None}
+
+    def _delete(self, query: dict, many: bool) -> int:
+        deleted = 0
+        for document in list(self._matching(query)):
+            self._unindex(document)
+            del self._documents[document["_id"]]
+            deleted += 1
+            if not many:
+                break
+        return deleted
+
+    async def find_one(self, query: dict | None = None, projection: dict | None = None) -> dict | None:
+        for document in self._matching(query):
+            return project(document, projection)
+        return None
+
+    def find(self, query: dict | None = None, projection: dict | None = None) -> MemoryCursor:
+        return MemoryCursor(self._matching(query), projection)
+
+    async def count_documents(self, query: dict) -> int:
+        return sum(1 for _ in self._matching(query))
+
+    async def insert_one(self, document: dict) -> InsertOneResult:
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True) -> InsertManyResult:
+        ids = []
+        error = None
+        for document in documents:
+            try:
+                ids.append(self._insert(document))
+            except DuplicateKeyError as e:
+                if ordered:
+                    raise
+                error = e
+        if error is not None:
+            raise error
+        return InsertManyResult(ids, True)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        return UpdateResult(self._update(query, update, upsert, many=False), True)
+
+    async def update_many(self, query: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        return UpdateResult(self._update(query, update, upsert, many=True), True)
+
+    async def find_one_and_update(
+        self,
+        query: dict,
+        update: dict,
+        projection: dict | None = None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+    ) -> dict | None:
+        for document in self._matching(query):
+            before = copy.deepcopy(document)
+            self._update({"_id": document["_id"]}, update, upsert=False, many=False)
+            after = self._documents[document["_id"]]
+            return project(after if return_document == ReturnDocument.AFTER else before, projection)
+
+        if not upsert:
+            return None
+        result = self._update(query, update, upsert=True, many=False)
+        if return_document == ReturnDocument.AFTER:
+            return project(self._documents[result["upserted"]], projection)
+        return None
+
+    async def replace_one(self, query: dict, replacement: dict, upsert: bool = False) -> UpdateResult:
+        return UpdateResult(self._replace(query, replacement, upsert), True)
+
+    async def delete_one(self, query: dict) -> DeleteResult:
+        return DeleteResult({"n": self._delete(query, many=False)}, True)
+
+    async def delete_many(self, query: dict) -> DeleteResult:
+        return DeleteResult({"n": self._delete(query, many=True)}, True)
+
+    async def bulk_write(self, operations: list, ordered: bool = True) -> BulkWriteResult:
+        result = {
+            "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+        }
+        for i, operation in enumerate(operations):
+            if isinstance(operation, InsertOne):
+                self._insert(operation._doc)
+                result["nInserted"] += 1
+                continue
+            if isinstance(operation, (DeleteOne, DeleteMany)):
+                result["nRemoved"] += self._delete(operation._filter, many=isinstance(operation, DeleteMany))
+                continue
+
+            if isinstance(operation, ReplaceOne):
+                raw = self._replace(operation._filter, operation._doc, bool(operation._upsert))
+            elif isinstance(operation, (UpdateOne, UpdateMany)):
+                raw = self._update(operation._filter, operation._doc, bool(operation._upsert), many=isinstance(operation, UpdateMany))
+            else:
+                raise NotImplementedError(f"Bulk operation {type(operation).__name__} is not supported by the memory backend")
+
+            if raw["upserted"] is not None:
+                result["nUpserted"] += 1
+                result["upserted"].append({"index": i, "_id": raw["upserted"]})
+            else:
+                result["nMatched"] += raw["n"]
+            result["nModified"] += raw["nModified"]
+
+        return BulkWriteResult(result, True)
+
+    def aggregate(self, pipeline: list[dict]) -> MemoryCursor:
+        documents: Iterable[dict] = self._matching({})
+        for stage in pipeline:
+            (operator, argument), = stage.items()
+            if operator == "$match":
+                documents = [document for document in documents if matches(document, argument)]
+            elif operator == "$sort":
+                documents = _sort(list(documents), _normalize_sort(argument))
+            elif operator == "$skip":
+                documents = list(documents)[argument:]
+            elif operator == "$limit":
+                documents = list(documents)[:argument]
+            elif operator == "$project":
+                documents = [project(document, argument) for document in documents]
+            elif operator == "$count":
+                count = sum(1 for _ in documents)
+                documents = [{argument: count}] if count else []
+            else:
+                raise NotImplementedError(f"Aggregation stage {operator} is not supported by the memory backend")
+
+        return MemoryCursor(documents)
+
+    # Only the leading field of each index is hashed; uniqueness and TTLs are
+    # not enforced
+    async def create_indexes(self, indexes: list[IndexModel]) -> list[str]:
+        names = []
+        for index in indexes:
+            field = next(iter(index.document["key"]))
+            self._add_hash_index(field)
+            names.append(index.document["name"])
+            if index.document["name"] not in self._index_names:
+                self._index_names.append(index.document["name"])
+        return names
+
+
+class MemoryClient():
+    """
+    Drop-in replacement for MongoClient holding every collection in process.
+    """
+
+    def __init__(self):
+        self._collections: dict[str, MemoryCollection] = {}
+        # No commands to monitor, see modules.db.monitoring.
+        self.monitor = None
+        _log.warning("Using the in-memory database backend, nothing will be persisted")
+
+    async def get_collection(self, collection: str) -> MemoryCollection:
+        if collection not in self._collections:
+            self._collections[collection] = MemoryCollection(collection)
+        return self._collections[collection]
@@ -0,0 +1,227 @@
+# Command monitoring of the Motor client. Every command is attributed to the
+# route (or the tracker tick) that issued it through a contextvar, which Motor
+# copies into the executor thread running the pymongo call, so the listener can
+# read it when the command completes.
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+import bson
+from pymongo import monitoring
+
+from modules import metrics
+
+# Commands slower than this many milliseconds are logged with the shape of their arguments.
+SLOW_QUERY_MS = float(os.getenv("MONGODB_SLOW_QUERY_MS", "100"))
+# Commands logged in full are truncated to this many characters.
+SLOW_QUERY_LOG_CHARS = 500
+# Label of commands issued outside of any request or tick (startup, background tasks).
+UNATTRIBUTED_ROUTE = "<unattributed>"
+# Bookkeeping commands that aren't round trips made on behalf of the app.
+IGNORED_COMMANDS = frozenset({"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions"})
+
+# Round trips of one request or tick, see web.middlewares.metrics.MetricsMiddleware.
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+_log = logging.getLogger("uvicorn")
+
+
+class RouteTag():
+    """
+    Route a command is attributed to, plus the commands issued under it so far.
+
+    'scope' is the ASGI scope of a request; its route template is only known
+    once FastAPI has routed it, so the name is resolved when read.
+    """
+
+    def __init__(self, name: str | None = None, scope: dict | None = None):
+        self._name = name
+        self._scope = scope
+        self.commands = 0
+
+    @property
+    def name(self) -> str:
+        if self._name is not None:
+            return self._name
+        route = self._scope.get("route") if self._scope is not None else None
+        return f"{self._scope['method']} {route.path}" if route is not None else UNATTRIBUTED_ROUTE
+
+
+current_route: ContextVar[RouteTag | None] = ContextVar("current_route", default=None)
+
+
+# Attribute the commands issued inside the block to 'tag', and record how many
+# round trips it made once it exits
+@contextmanager
+def route_scope(tag: RouteTag) -> Iterator[RouteTag]:
+    token = current_route.set(tag)
+    try:
+        yield tag
+    finally:
+        current_route.reset(token)
+        DB_ROUND_TRIPS.observe(tag.commands, (tag.name,))
+
+
+# Number of documents a command returned
+def _documents_returned(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if "values" in reply: # distinct
+        return len(reply["values"])
+    return 1 if reply.get("value") is not None else 0 # findAndModify
+
+
+# Shape of a command argument: keys and nesting kept, every value replaced by
+# its type name so documents, filters and updates never leak their contents
+# (password hashes, picture bytes) into the log
+def _shape(value, depth: int = 0):
+    if depth >= 6:
+        return "..."
+    if isinstance(value, dict):
+        return {key: _shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return []
+        shape = [_shape(value[0], depth + 1)]
+        return shape + [f"... {len(value) - 1} more"] if len(value) > 1 else shape
+    return type(value).__name__
+
+
+# Command as logged: session and cluster fields dropped, arguments reduced to
+# their shape
+def _describe(command: dict) -> str:
+    described = {
+        key: value if isinstance(value, str) and key == next(iter(command)) else _shape(value)
+        for key, value in command.items()
+        if key != "lsid" and not key.startswith("$")
+    }
+    return str(described)[:SLOW_QUERY_LOG_CHARS]
+
+
+class _RouteStats():
+    def __init__(self):
+        self.commands = 0
+        self.failures = 0
+        self.slow = 0
+        self.duration = 0.0 # seconds
+        self.documents = 0
+        self.by_command: dict[str, int] = {}
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """
+    Records duration and documents returned of every command, per route, and
+    logs those slower than 'slow_query_ms' with the BSON size of their reply.
+
+    Callbacks run on Motor's executor threads, hence the lock.
+    """
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        # (connection id, request id) -> (route tag, collection, command) of in-flight commands
+        self._started: dict[tuple, tuple[RouteTag | None, str, dict]] = {}
+        self._routes: dict[str, _RouteStats] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+
+        collection = event.command.get(event.command_name)
+        collection = collection if isinstance(collection, str) else event.database_name
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = (current_route.get(), collection, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, None)
+
+    def _finish(self, event: monitoring.CommandSucceededEvent | monitoring.CommandFailedEvent, reply: dict | None) -> None:
+        with self._lock:
+            started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+
+        tag, collection, command = started
+        route = tag.name if tag is not None else UNATTRIBUTED_ROUTE
+        duration = event.duration_micros / 1_000_000
+        documents = _documents_returned(reply) if reply is not None else 0
+        slow = duration * 1000 >= self.slow_query_ms
+
+        with self._lock:
+            if tag is not None:
+                tag.commands += 1
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = _RouteStats()
+            stats.commands += 1
+            stats.failures += reply is None
+            stats.slow += slow
+            stats.duration += duration
+            stats.documents += documents
+            stats.by_command[event.command_name] = stats.by_command.get(event.command_name, 0) + 1
+
+            labels = (route, event.command_name, collection)
+            DB_COMMANDS.inc(labels)
+            DB_COMMAND_DURATION.observe(duration, labels)
+            DB_DOCUMENTS_RETURNED.inc(labels, documents)
+            if reply is None:
+                DB_COMMAND_FAILURES.inc(labels)
+
+        if slow:
+            # The reply is re-encoded to size it, only worth it for slow commands.
+            size = len(bson.encode(reply)) if reply is not None else 0
+            _log.warning(
+                f"Slow {event.command_name} on {collection} ({duration * 1000:.1f}ms, {documents} doc(s), "
+                f"{size} byte(s)) from {route}: {_describe(command)}"
+            )
+
+    # Aggregates per route, with the average round trips of one request or tick
+    # so N+1 query patterns stand out
+    def stats(self) -> dict:
+        with self._lock:
+            routes = {
+                route: {
+                    "commands": stats.commands,
+                    "failures": stats.failures,
+                    "slow": stats.slow,
+                    "duration": stats.duration,
+                    "documents": stats.documents,
+                    "by_command": dict(stats.by_command),
+                }
+                for route, stats in self._routes.items()
+            }
+
+        for route, stats in routes.items():
+            scopes = DB_ROUND_TRIPS.count((route,))
+            stats["scopes"] = scopes
+            stats["round_trips_per_scope"] = stats["commands"] / scopes if scopes else None
+
+        return {
+            "slow_query_ms": self.slow_query_ms,
+            "routes": dict(sorted(routes.items(), key=lambda item: item[1]["duration"], reverse=True)),
+        }
+
+
+DB_COMMANDS = metrics.REGISTRY.counter(
+    "mongodb_commands_total", "MongoDB commands by route, command and collection", ("route", "command", "collection")
+)
+DB_COMMAND_FAILURES = metrics.REGISTRY.counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands", ("route", "command", "collection")
+)
+DB_COMMAND_DURATION = metrics.REGISTRY.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ("route", "command", "collection")
+)
+DB_DOCUMENTS_RETURNED = metrics.REGISTRY.counter(
+    "mongodb_documents_returned_total", "Documents returned by MongoDB commands", ("route", "command", "collection")
+)
+DB_ROUND_TRIPS = metrics.REGISTRY.histogram(
+    "mongodb_round_trips", "MongoDB commands issued by one request or tracker tick", ("route",), ROUND_TRIP_BUCKETS
+)
@@ -4,4 +4,21 @@ from enum import StrEnum
 class PictureRef(StrEnum):
     ID = "_id"
     USER = "user_id"
+    # Legacy base64 string, only present on pictures stored before the binary
+    # format. Migrated on first read.
     PICTURE = "picture"
+    HASH = "hash"
+    CONTENT_TYPE = "content_type"
+    LENGTH = "length"
+    CHUNKS = "chunks"
+    UPDATED = "updated_at"
+    # Resized copies keyed by size, each with its own hash/content type/length/chunks.
+    VARIANTS = "variants"
+
+
+class PictureChunkRef(StrEnum):
+    ID = "_id"
+    USER = "user_id"
+    HASH = "hash"
+    N = "n"
+    DATA = "data"
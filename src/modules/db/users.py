@@ -11,3 +11,5 @@ class UserRef(StrEnum):
     SELECTED_FRIEND = "selected_friend"
     FRIENDS = "friends"
     ACHIEVEMENTS = "achievements"
+    QUESTIONS_ANSWERED = "questions_answered"
+    PREVIOUS_QUESTION_ANSWERED_AT = "previous_question_answered_at"
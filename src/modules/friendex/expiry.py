@@ -0,0 +1,42 @@
+import heapq
+import itertools
+from datetime import datetime
+from typing import Any, Hashable
+
+
+class ExpiryQueue():
+    """
+    Min-heap of (deadline, key, token) entries.
+
+    Entries are never updated in place: refreshing something just pushes a new
+    entry, and stale ones are told apart by their token when they pop. Callers
+    compare the token with their current state (e.g. the timestamp of a
+    location) and ignore entries that no longer match.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[datetime, int, Hashable, Any]] = []
+        # Tie breaker so keys and tokens never have to be comparable.
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, deadline: datetime, key: Hashable, token: Any = None) -> None:
+        heapq.heappush(self._heap, (deadline, next(self._counter), key, token))
+
+    # Returns the deadline of the next entry to expire, if any
+    def peek(self) -> datetime | None:
+        return self._heap[0][0] if self._heap else None
+
+    # Pops and returns every (key, token) whose deadline is at or before 'now'
+    def pop_expired(self, now: datetime) -> list[tuple[Hashable, Any]]:
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, key, token = heapq.heappop(self._heap)
+            expired.append((key, token))
+
+        return expired
+
+    def clear(self) -> None:
+        self._heap.clear()
@@ -0,0 +1,130 @@
+import bisect
+import math
+
+import numpy as np
+
+from modules.friendex import locations
+from modules.friendex.spatial import KM_PER_DEGREE, haversine, haversine_many
+
+# The planar prefilter is an equirectangular approximation, so give it a little
+# slack before trusting it to reject a circle. The exact haversine check always
+# has the final say.
+PLANAR_SLACK = 1.01
+
+# Number of points classified per broadcast in ClassroomIndex.contains_many.
+BATCH_CHUNK = 2048
+
+
+class ClassroomIndex():
+    """
+    Circles from CLASSROOM_LOCATIONS compiled once into sorted NumPy arrays.
+
+    Single point lookups bisect the latitude-sorted centres, drop circles with a
+    cheap planar distance check and only run haversine on the few that remain.
+    `contains_many` classifies a whole batch of coordinates in one call.
+    """
+
+    def __init__(self, circles: list[dict]):
+        circles = sorted(circles, key=lambda circle: circle["coords"][0])
+
+        self.lats = np.array([circle["coords"][0] for circle in circles], dtype=np.float64)
+        self.longs = np.array([circle["coords"][1] for circle in circles], dtype=np.float64)
+        # Radii are stored in metres in CLASSROOM_LOCATIONS, everything here is km.
+        self.radii = np.array([circle["radius"] / 1000 for circle in circles], dtype=np.float64)
+
+        # Plain lists are faster than NumPy scalars for the single point path.
+        self._lats = self.lats.tolist()
+        self._longs = self.longs.tolist()
+        self._radii = self.radii.tolist()
+
+        max_radius = float(self.radii.max()) if len(circles) else 0.0
+        self.lat_margin = max_radius / KM_PER_DEGREE
+
+        # Bounding box around every circle, used to reject far away points
+        # outright. Longitude margins are widened by the worst case latitude.
+        if len(circles):
+            widest_lat = max(abs(float(self.lats.min())), abs(float(self.lats.max()))) + self.lat_margin
+            long_margin = self.lat_margin / max(math.cos(math.radians(min(widest_lat, 89.0))), 1e-9)
+            self.bounds = (
+                float(self.lats.min()) - self.lat_margin,
+                float(self.lats.max()) + self.lat_margin,
+                float(self.longs.min()) - long_margin,
+                float(self.longs.max()) + long_margin,
+            )
+        else:
+            self.bounds = (math.inf, -math.inf, math.inf, -math.inf)
+
+    def __len__(self) -> int:
+        return len(self._lats)
+
+    def _in_bounds(self, lat: float, long: float) -> bool:
+        min_lat, max_lat, min_long, max_long = self.bounds
+        return min_lat <= lat <= max_lat and min_long <= long <= max_long
+
+    # Returns whether (lat, long) is inside any of the circles
+    def contains(self, lat: float, long: float) -> bool:
+        if not self._in_bounds(lat, long):
+            return False
+
+        start = bisect.bisect_left(self._lats, lat - self.lat_margin)
+        end = bisect.bisect_right(self._lats, lat + self.lat_margin)
+        long_scale = KM_PER_DEGREE * math.cos(math.radians(lat))
+
+        for i in range(start, end):
+            radius = self._radii[i]
+            dy = (lat - self._lats[i]) * KM_PER_DEGREE
+            dx = (long - self._longs[i]) * long_scale
+            if dx * dx + dy * dy > (radius * PLANAR_SLACK) ** 2:
+                continue
+
+            if haversine((lat, long), (self._lats[i], self._longs[i])) <= radius:
+                return True
+
+        return False
+
+    # Returns a boolean array marking which of the given coordinates are inside
+    # any of the circles. Same steps as `contains`, vectorised: each point is
+    # only compared with the circles of its latitude window, and haversine only
+    # runs on the pairs that pass the planar prefilter.
+    def contains_many(self, lats, longs) -> np.ndarray:
+        lats = np.asarray(lats, dtype=np.float64)
+        longs = np.asarray(longs, dtype=np.float64)
+        result = np.zeros(lats.shape, dtype=bool)
+
+        min_lat, max_lat, min_long, max_long = self.bounds
+        candidates = np.flatnonzero(
+            (lats >= min_lat) & (lats <= max_lat) & (longs >= min_long) & (longs <= max_long)
+        )
+        starts = np.searchsorted(self.lats, lats[candidates] - self.lat_margin, side="left")
+        ends = np.searchsorted(self.lats, lats[candidates] + self.lat_margin, side="right")
+        windowed = ends > starts
+        candidates, starts, ends = candidates[windowed], starts[windowed], ends[windowed]
+
+        for chunk_start in range(0, len(candidates), BATCH_CHUNK):
+            chunk = candidates[chunk_start:chunk_start + BATCH_CHUNK]
+            chunk_starts = starts[chunk_start:chunk_start + BATCH_CHUNK]
+            chunk_ends = ends[chunk_start:chunk_start + BATCH_CHUNK]
+
+            # Circle indices of every window, padded to the widest one.
+            circles = chunk_starts[:, None] + np.arange(int((chunk_ends - chunk_starts).max()))[None, :]
+            in_window = circles < chunk_ends[:, None]
+            circles = np.minimum(circles, len(self.lats) - 1)
+
+            chunk_lats = lats[chunk, None]
+            chunk_longs = longs[chunk, None]
+            dy = (chunk_lats - self.lats[circles]) * KM_PER_DEGREE
+            dx = (chunk_longs - self.longs[circles]) * (KM_PER_DEGREE * np.cos(np.radians(chunk_lats)))
+            radii = self.radii[circles]
+            rows, columns = np.nonzero(in_window & (dx * dx + dy * dy <= (radii * PLANAR_SLACK) ** 2))
+            if not len(rows):
+                continue
+
+            circle = circles[rows, columns]
+            distances = haversine_many(chunk_lats[rows, 0], chunk_longs[rows, 0], self.lats[circle], self.longs[circle])
+            result[chunk[rows[distances <= self.radii[circle]]]] = True
+
+        return result
+
+
+# Compiled once on import so every tick reuses the same arrays.
+CLASSROOM_INDEX = ClassroomIndex(locations.CLASSROOM_LOCATIONS)
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable
+
+from modules import metrics
+
+# What to do with ticks missed because a tick (or the event loop) ran late:
+# "compensate" runs the next tick with awards scaled by the intervals elapsed,
+# "skip" drops them.
+OVERRUN_POLICIES = ("compensate", "skip")
+# Awards are scaled by at most this many intervals, so a loop stalled for
+# minutes (e.g. a suspended host) doesn't hand out a burst of points.
+MAX_COMPENSATED_TICKS = 12
+
+_log = logging.getLogger("uvicorn")
+
+
+class TickScheduler():
+    """
+    Calls 'tick(scale)' every 'interval' seconds at a fixed rate: deadlines are
+    computed from the monotonic clock, so the time a tick takes doesn't add up
+    to the period.
+
+    A tick starting one or more whole intervals after its deadline counts the
+    missed ticks as overruns, handled according to 'policy'. 'scale' is the
+    number of intervals the tick accounts for, 1 unless missed ticks are
+    compensated. An exception in a tick is logged and the next one still runs.
+    """
+
+    def __init__(
+        self,
+        tick: Callable[[float], Awaitable[None]],
+        interval: float,
+        policy: str = "compensate",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if policy not in OVERRUN_POLICIES:
+            raise ValueError(f"Unknown overrun policy '{policy}', expected one of {', '.join(OVERRUN_POLICIES)}")
+
+        self.tick = tick
+        self.interval = interval
+        self.policy = policy
+        self.clock = clock
+
+        self.ticks = 0
+        self.failed = 0
+        self.overruns = 0
+        self.compensated = 0
+        self.skipped = 0
+        self.max_lag = 0.0
+
+    @classmethod
+    def from_env(cls, prefix: str, tick: Callable[[float], Awaitable[None]], interval: float) -> "TickScheduler":
+        configured = os.getenv(f"{prefix}_INTERVAL")
+        return cls(
+            tick,
+            interval=float(configured) if configured else interval,
+            policy=os.getenv(f"{prefix}_OVERRUN_POLICY", "compensate"),
+        )
+
+    async def run(self) -> None:
+        deadline = self.clock()
+        while True:
+            now = self.clock()
+            if now < deadline:
+                await asyncio.sleep(deadline - now)
+                now = self.clock()
+
+            lag = now - deadline
+            self.max_lag = max(self.max_lag, lag)
+            missed = int(lag // self.interval)
+            scale = 1
+            if missed:
+                self.overruns += missed
+                metrics.TRACKER_TICK_OVERRUNS.inc(amount=missed)
+                if self.policy == "compensate":
+                    scale = 1 + min(missed, MAX_COMPENSATED_TICKS - 1)
+                    self.compensated += scale - 1
+                else:
+                    self.skipped += missed
+                _log.warning(f"Tick ran {lag:.2f}s late, {missed} tick(s) missed ({self.policy})")
+
+            # The next deadline stays on the original grid, missed ones included.
+            deadline += (missed + 1) * self.interval
+
+            self.ticks += 1
+            try:
+                await self.tick(scale)
+            except Exception:
+                self.failed += 1
+                metrics.TRACKER_TICK_FAILURES.inc()
+                _log.exception("Tick failed")
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "policy": self.policy,
+            "ticks": self.ticks,
+            "failed": self.failed,
+            "overruns": self.overruns,
+            "compensated": self.compensated,
+            "skipped": self.skipped,
+            "max_lag": self.max_lag,
+        }
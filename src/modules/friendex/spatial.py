@@ -0,0 +1,140 @@
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS = 6371.0 # km
+KM_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+# Size of a single grid cell along each axis, in degrees. Around 0.002 degrees
+# is ~220m of latitude, which keeps the usual radius-fetch query within a 3x3
+# block of cells.
+GRID_CELL_DEGREES = 0.002
+
+# Returns distance between 2 (latitude, longitude) pairs in km
+def haversine(point1, point2) -> float:
+    (lat1, lon1) = point1
+    (lat2, lon2) = point2
+    # Returns the distance in km between two places with given latitudes and
+    # longitudes. Radius of the Earth in kilometers
+    R = EARTH_RADIUS
+
+    # Convert latitude and longitude from degrees to radians
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+
+    # Differences in coordinates
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    # Haversine formula
+    a = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
+    )
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    # Calculate the distance
+    distance = R * c
+
+    return distance
+
+
+# Vectorised haversine over NumPy arrays (or scalars), broadcasting like any
+# other ufunc. Returns distances in km.
+def haversine_many(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = np.radians(lon2) - np.radians(lon1)
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class LocationGrid():
+    """
+    Fixed-cell grid over (latitude, longitude) used to answer radius queries
+    without scanning every known location.
+
+    Each id lives in exactly one cell. A radius query only visits the cells
+    overlapping the bounding box of the circle and returns the ids found there,
+    which still need an exact distance check by the caller.
+    """
+
+    def __init__(self, cell_degrees: float = GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.lon_cells = math.ceil(360 / cell_degrees)
+        self.cells: dict[tuple[int, int], set[str]] = {}
+        self.cell_of: dict[str, tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.cell_of)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.cell_of
+
+    def _cell(self, lat: float, long: float) -> tuple[int, int]:
+        return (
+            math.floor(lat / self.cell_degrees),
+            math.floor(long / self.cell_degrees) % self.lon_cells,
+        )
+
+    # Move (or add) an id into the cell covering the given coordinates
+    def insert(self, id: str, lat: float, long: float) -> None:
+        cell = self._cell(lat, long)
+        previous = self.cell_of.get(id)
+        if previous == cell:
+            return
+        if previous is not None:
+            self._discard(id, previous)
+
+        self.cell_of[id] = cell
+        self.cells.setdefault(cell, set()).add(id)
+
+    def remove(self, id: str) -> None:
+        cell = self.cell_of.pop(id, None)
+        if cell is not None:
+            self._discard(id, cell)
+
+    def _discard(self, id: str, cell: tuple[int, int]) -> None:
+        members = self.cells.get(cell)
+        if members is None:
+            return
+        members.discard(id)
+        if not members:
+            del self.cells[cell]
+
+    # Returns every id stored in a cell overlapping the bounding box of the
+    # circle of 'radius' km around (lat, long)
+    def candidates(self, lat: float, long: float, radius: float) -> list[str]:
+        lat_span = radius / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(abs(lat) + lat_span, 90.0)))
+        if cos_lat <= 1e-9:
+            # Circle touches a pole, every longitude is in range.
+            return list(self.cell_of)
+        long_span = lat_span / cos_lat
+
+        min_row, min_col = self._cell(lat - lat_span, long - long_span)
+        max_row = math.floor((lat + lat_span) / self.cell_degrees)
+        col_count = math.floor((long + long_span) / self.cell_degrees) - math.floor((long - long_span) / self.cell_degrees) + 1
+        col_count = min(col_count, self.lon_cells)
+
+        # Large radii would visit more (mostly empty) cells than there are
+        # entries, so walk the occupied cells instead.
+        if (max_row - min_row + 1) * col_count > len(self.cells):
+            result = []
+            for (row, col), members in self.cells.items():
+                if min_row <= row <= max_row and (col - min_col) % self.lon_cells < col_count:
+                    result.extend(members)
+            return result
+
+        result = []
+        for row in range(min_row, max_row + 1):
+            for offset in range(col_count):
+                members = self.cells.get((row, (min_col + offset) % self.lon_cells))
+                if members:
+                    result.extend(members)
+        return result
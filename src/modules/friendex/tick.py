@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import numpy as np
+
+from modules.friendex.geofence import CLASSROOM_INDEX
+from modules.friendex.spatial import haversine_many
+from modules.friendex.tracking import TrackingDto
+
+
+# Evaluates every tracked pair for one tick in a single vectorised pass.
+#
+# Pairs where either player has no known location (or a player tracking
+# themselves) are skipped. The coordinates of the remaining pairs are gathered
+# into contiguous arrays, all distances and classroom multipliers are computed at
+# once, and only then are the co-located pairs returned along with the
+# multiplier for each side.
+def evaluate_pairs(
+    pairs: list[TrackingDto],
+    locations: dict[str, tuple[float, float, datetime]],
+    max_distance: float,
+    classroom_multiplier: int,
+) -> tuple[list[TrackingDto], np.ndarray, np.ndarray]:
+    ready = [
+        tracking for tracking in pairs
+        if tracking.id_1 != tracking.id_2 and tracking.id_1 in locations and tracking.id_2 in locations
+    ]
+    if not ready:
+        empty = np.zeros(0, dtype=np.int64)
+        return [], empty, empty
+
+    count = len(ready)
+    coords = np.empty((4, count), dtype=np.float64)
+    coords[0] = np.fromiter((locations[tracking.id_1][0] for tracking in ready), dtype=np.float64, count=count)
+    coords[1] = np.fromiter((locations[tracking.id_1][1] for tracking in ready), dtype=np.float64, count=count)
+    coords[2] = np.fromiter((locations[tracking.id_2][0] for tracking in ready), dtype=np.float64, count=count)
+    coords[3] = np.fromiter((locations[tracking.id_2][1] for tracking in ready), dtype=np.float64, count=count)
+
+    distances = haversine_many(coords[0], coords[1], coords[2], coords[3])
+    colocated_idx = np.flatnonzero(distances <= max_distance)
+    colocated = [ready[i] for i in colocated_idx.tolist()]
+
+    # Classify both sides of every co-located pair against the classrooms in one
+    # call: the first half of the batch is id_1, the second half id_2.
+    in_classroom = CLASSROOM_INDEX.contains_many(
+        np.concatenate((coords[0, colocated_idx], coords[2, colocated_idx])),
+        np.concatenate((coords[1, colocated_idx], coords[3, colocated_idx])),
+    )
+    multipliers = np.where(in_classroom, classroom_multiplier, 1)
+    half = len(colocated_idx)
+
+    return colocated, multipliers[:half], multipliers[half:]
@@ -1,120 +1,158 @@
-import asyncio
+import logging
+import time
 from datetime import datetime, timedelta, timezone
 
 from pydantic import BaseModel
 
 import config
+from modules import metrics
 from modules.db import CollectionRef, UserRef
+from modules.db.monitoring import RouteTag, route_scope
 from models.user_models import UserDto
-from modules.friendex import locations
-from web.routers.location_routes import haversine
+from modules.friendex.expiry import ExpiryQueue
+from modules.friendex.geofence import CLASSROOM_INDEX
+from modules.friendex.scheduler import TickScheduler
+from modules.friendex.spatial import LocationGrid, haversine
+from modules.friendex.tick import evaluate_pairs
+from modules.friendex.tracking import TrackingDto, TrackingIndex
+from web.auth.user_auth import invalidate_cached_user
 
 
 LOCATION_TTL = 5
 TRACKING_TTL = 60 * 20
+LOCATION_EXPIRY = timedelta(seconds=LOCATION_TTL)
+TRACKING_EXPIRY = timedelta(seconds=TRACKING_TTL)
 
 MAX_DISTANCE = 0.008 # 8 meters
 
 TICK_INTERVAL = 5 # seconds
 POINTS_PER_TICK = 1
+CLASSROOM_MULTIPLIER = 2
+# Route the database commands of a tick are attributed to.
+TICK_ROUTE = "tracker tick"
 
-class TrackingDto(BaseModel):
-    id_1: str
-    id_2: str
-    tracker_points_accumulated: float = 0.0
-    tracking_points_accumulated: float = 0.0
-    created_at: datetime
+_log = logging.getLogger("uvicorn")
+
+
+class PointsFlushDto(BaseModel):
+    operations: int = 0
+    points: float = 0.0
+    flushed_at: datetime | None = None
 
 
 class PlayersTracker():
     locations: dict[str, tuple[int, int, datetime]] = {}
     # First and second UUID is user A and B respectively, where A is the one who has selected B.
-    currently_tracking: list[TrackingDto] = []
+    currently_tracking: TrackingIndex
+    # Spatial index over 'locations', kept in sync on every update/removal.
+    location_grid: LocationGrid
+    # Points awarded during the current tick, handed to config.points at its end.
+    pending_points: dict[str, float]
+    last_flush: PointsFlushDto
+    # Deadlines of locations and tracking pairs, so cleanup only touches what expired.
+    location_expiry: ExpiryQueue
+    tracking_expiry: ExpiryQueue
+    # Set once start_loop runs.
+    scheduler: TickScheduler | None
+
+    def __init__(self):
+        self.locations = {}
+        self.currently_tracking = TrackingIndex()
+        self.location_grid = LocationGrid()
+        self.pending_points = {}
+        self.last_flush = PointsFlushDto()
+        self.location_expiry = ExpiryQueue()
+        self.tracking_expiry = ExpiryQueue()
+        self.scheduler = None
 
     def get_player_tracking(self, id: str) -> TrackingDto:
-        for tracking in self.currently_tracking:
-            if tracking.id_1 == id or tracking.id_2 == id:
-                return tracking
-            
-        return None
-
-    # Run event loop every tick
-    async def on_tick(self) -> None:
-        # Give points and shit here
-        await self.cleanup()
-        
-        for tracking in self.currently_tracking:
-            if tracking.id_1 not in self.locations.keys():
-                return
-            elif tracking.id_2 not in self.locations.keys():
-                return
-
-            lat_1, long_1, _ = self.locations[tracking.id_1]
-            lat_2, long_2, _ = self.locations[tracking.id_2]
-
-            if tracking.id_1 == tracking.id_2:
-                continue
-
-            distance = haversine((lat_1, long_1), (lat_2, long_2))
-
-            if distance <= MAX_DISTANCE:
-                multiplier_1 = self.classroom_multiplier(tracking.id_1)
-                multiplier_2 = self.classroom_multiplier(tracking.id_2)
-
-                await self.give_points(tracking.id_1, multiplier_1)
-                await self.give_points(tracking.id_2, multiplier_2)
-
-    # Allocate points each set interval of time, accounting for classroom based multipliers
-    async def give_points(self, user_id: str, multiplier: float) -> None:
-        user_collection = await config.db.get_collection(CollectionRef.USERS)
-        user = UserDto.model_validate(await user_collection.find_one({UserRef.ID: user_id}))
-
+        return self.currently_tracking.get(id)
+
+    # Run event loop every tick. 'scale' is the number of tick intervals to
+    # award points for, see TickScheduler.
+    async def on_tick(self, scale: float = 1) -> None:
+        start = time.perf_counter()
+        with route_scope(RouteTag(TICK_ROUTE)):
+            # Give points and shit here
+            await self.cleanup()
+
+            colocated, multipliers_1, multipliers_2 = evaluate_pairs(
+                list(self.currently_tracking), self.locations, MAX_DISTANCE, CLASSROOM_MULTIPLIER
+            )
+            for tracking, multiplier_1, multiplier_2 in zip(colocated, multipliers_1.tolist(), multipliers_2.tolist()):
+                self.give_points(tracking.id_1, multiplier_1 * scale, tracking)
+                self.give_points(tracking.id_2, multiplier_2 * scale, tracking)
+
+            flush = self.flush_points()
+        self.record_tick(time.perf_counter() - start, flush)
+
+    def record_tick(self, duration: float, flush: PointsFlushDto) -> None:
+        metrics.TRACKER_TICK_DURATION.observe(duration)
+        metrics.TRACKER_LOCATIONS.set(len(self.locations))
+        metrics.TRACKER_PAIRS.set(len(self.currently_tracking))
+        metrics.TRACKER_AWARDED_USERS.set(flush.operations)
+        metrics.TRACKER_AWARDED_POINTS.inc(amount=flush.points)
+
+    # Allocate points each set interval of time, accounting for classroom based multipliers.
+    # Points are only queued here, see flush_points.
+    def give_points(self, user_id: str, multiplier: float, tracking: TrackingDto | None = None) -> None:
         points = POINTS_PER_TICK * multiplier
 
-        user.points += points
-        tracking = self.get_player_tracking(user_id)
+        self.pending_points[user_id] = self.pending_points.get(user_id, 0) + points
+        if tracking is None:
+            tracking = self.get_player_tracking(user_id)
         if tracking:
             if tracking.id_1 == user_id:
                 tracking.tracker_points_accumulated += points
             elif tracking.id_2 == user_id:
                 tracking.tracking_points_accumulated += points
 
-        await user_collection.update_one(
-            {UserRef.ID: user.id},
-            {"$set": user.model_dump()}
+    # Hand the points queued during this tick to the points buffer, which
+    # coalesces them with other awards and writes them to Mongo, see modules.points
+    def flush_points(self) -> PointsFlushDto:
+        pending, self.pending_points = self.pending_points, {}
+        if pending:
+            config.points.add_many(pending)
+
+        self.last_flush = PointsFlushDto(
+            operations=len(pending),
+            points=sum(pending.values()),
+            flushed_at=datetime.now(timezone.utc),
         )
+        return self.last_flush
 
-        return {"message": f"Awarded {points} points to {user.id} with multiplier {multiplier}"}
-        
     # Remove tracking / locations based on TTL
     async def cleanup(self) -> None:
-        user_collection = await config.db.get_collection(CollectionRef.USERS)
-
-        ids_to_remove = []
-        for id, location in self.locations.items():
-            lat, long, ttl = location
-            if datetime.now(timezone.utc) - ttl > timedelta(seconds=LOCATION_TTL):
-                ids_to_remove.append(id)
-        [self.locations.pop(id, None) for id in ids_to_remove]
-        
-        tracking_to_remove = []
-        for tracking in self.currently_tracking:
-            if datetime.now(timezone.utc) - tracking.created_at > timedelta(seconds=TRACKING_TTL):
-                user = UserDto.model_validate(await user_collection.find_one({UserRef.ID: tracking.id_1}))
-                user.selected_friend = None
-                await user_collection.update_one(
-                    {UserRef.ID: user.id},
-                    {"$set": user.model_dump()},
-                )
-
-                tracking_to_remove.append(tracking)
-        [self.currently_tracking.remove(tracking) for tracking in tracking_to_remove]
+        now = datetime.now(timezone.utc)
+
+        # Only entries whose deadline has passed are popped. An entry is stale
+        # (and ignored) if the location was refreshed or the pair was replaced
+        # since it was queued.
+        for id, timestamp in self.location_expiry.pop_expired(now):
+            location = self.locations.get(id)
+            if location is not None and location[2] == timestamp:
+                self.remove_location(id)
+
+        expired_trackers = []
+        for _, tracking in self.tracking_expiry.pop_expired(now):
+            if self.currently_tracking.includes(tracking):
+                self.currently_tracking.remove(tracking)
+                self.cancel_prefetch(tracking)
+                expired_trackers.append(tracking.id_1)
+
+        if expired_trackers:
+            user_collection = await config.db.get_collection(CollectionRef.USERS)
+            await user_collection.update_many(
+                {UserRef.ID: {"$in": expired_trackers}},
+                {"$set": {UserRef.SELECTED_FRIEND: None}},
+            )
+            invalidate_cached_user(*expired_trackers)
     
-    # Ensure code runs every set interval of time
+    # Ensure code runs every set interval of time. Configure with
+    # TRACKER_TICK_INTERVAL and TRACKER_TICK_OVERRUN_POLICY.
     async def start_loop(self) -> None:
-        while True:
-            await self.on_tick()
-            await asyncio.sleep(TICK_INTERVAL) # Adjust frequency as needed.
+        self.scheduler = TickScheduler.from_env("TRACKER_TICK", self.on_tick, TICK_INTERVAL)
+        await self.scheduler.run()
 
     async def populate(self) -> None:
         user_collection = await config.db.get_collection(CollectionRef.USERS)
@@ -145,52 +183,67 @@ class PlayersTracker():
             return tracking.tracker_points_accumulated
         elif tracking.id_2 == id:
             return tracking.tracking_points_accumulated
-        return self.currently_tracking[id][1]
+        return 0
 
     # Update a player's location in the tracker
     def update_location(self, id: str, lat: float, long: float) -> None:
-        self.locations[id] = (lat, long, datetime.now(timezone.utc))
+        timestamp = datetime.now(timezone.utc)
+        self.locations[id] = (lat, long, timestamp)
+        self.location_grid.insert(id, lat, long)
+        self.location_expiry.push(timestamp + LOCATION_EXPIRY, id, timestamp)
     
     # Remove a player's location in the tracker
     def remove_location(self, id: str) -> None:
         self.locations.pop(id, None)
+        self.location_grid.remove(id)
+
+    # Returns the locations of all players within 'radius' km of (lat, long),
+    # only looking at the grid cells the circle overlaps
+    def get_locations_within(self, lat: float, long: float, radius: float) -> dict[str, tuple[float, float]]:
+        nearby = {}
+        for id in self.location_grid.candidates(lat, long, radius):
+            other_lat, other_long, _ = self.locations[id]
+            if haversine((lat, long), (other_lat, other_long)) <= radius:
+                nearby[id] = (other_lat, other_long)
+
+        return nearby
     
     # Have a player track another player
     def add_tracking(self, id_1: str, id_2: str) -> None:
         # Have ttl logic for tracking whilst rewarding points
-        self.currently_tracking.append(TrackingDto(
+        tracking = TrackingDto(
             id_1=id_1,
             id_2=id_2,
             created_at=datetime.now(timezone.utc)
-        ))
-        ...
+        )
+        self.currently_tracking.add(tracking)
+        self.tracking_expiry.push(tracking.created_at + TRACKING_EXPIRY, (id_1, id_2), tracking)
+        if config.mcq_prefetcher is not None:
+            config.mcq_prefetcher.start(id_1, id_2)
 
     # Remove the tracking of a set player
     async def remove_tracking(self, id: str) -> None:
-        for tracking in self.currently_tracking:
-            print(tracking.id_1, tracking.id_2, id)
-            if tracking.id_1 == id or tracking.id_2 == id:
-                user_collection = await config.db.get_collection(CollectionRef.USERS)
-
-                user = UserDto.model_validate(await user_collection.find_one({UserRef.ID: tracking.id_1}))
-                user.selected_friend = None
-                await user_collection.update_one(
-                    {UserRef.ID: user.id},
-                    {"$set": user.model_dump()},
-                )
+        tracking = self.currently_tracking.get(id)
+        if not tracking:
+            return
+
+        user_collection = await config.db.get_collection(CollectionRef.USERS)
+        await user_collection.update_one(
+            {UserRef.ID: tracking.id_1},
+            {"$set": {UserRef.SELECTED_FRIEND: None}},
+        )
+
+        self.currently_tracking.remove(tracking)
+        self.cancel_prefetch(tracking)
+        invalidate_cached_user(tracking.id_1)
+
+    # Drop the MCQs prefetched for a pair that is no longer tracked
+    def cancel_prefetch(self, tracking: TrackingDto) -> None:
+        if config.mcq_prefetcher is not None:
+            config.mcq_prefetcher.cancel(tracking.id_1, tracking.id_2)
 
-                self.currently_tracking.remove(tracking)
-                break
-    
     # Add a multiplier if player is currently in the vicinity of a classroom
     def classroom_multiplier(self, user_id: str) -> int:
-        user_location_collection = self.locations.get(user_id)
-        lat, long, _ = user_location_collection
-
-        user_coords = (lat, long)
-        for location in locations.CLASSROOM_LOCATIONS:
-            distance = haversine(user_coords, location["coords"])
-            if distance <= location["radius"]/1000:
-                return 2
-    
-        return 1
\ No newline at end of file
+        lat, long, _ = self.locations[user_id]
+
+        return CLASSROOM_MULTIPLIER if CLASSROOM_INDEX.contains(lat, long) else 1
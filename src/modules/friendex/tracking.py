@@ -0,0 +1,70 @@
+from datetime import datetime
+from typing import Iterator
+
+from pydantic import BaseModel
+
+
+class TrackingDto(BaseModel):
+    id_1: str
+    id_2: str
+    tracker_points_accumulated: float = 0.0
+    tracking_points_accumulated: float = 0.0
+    created_at: datetime
+
+
+class TrackingIndex():
+    """
+    Active tracking pairs indexed by both participants.
+
+    Lookup, insertion and removal are O(1). Iterating yields pairs in the order
+    they were added, so the tick always processes them deterministically.
+    """
+
+    def __init__(self):
+        self._pairs: dict[tuple[str, str], TrackingDto] = {}
+        # Every pair a user takes part in (as either id_1 or id_2), oldest first.
+        self._by_user: dict[str, dict[tuple[str, str], TrackingDto]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def __iter__(self) -> Iterator[TrackingDto]:
+        return iter(self._pairs.values())
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._by_user
+
+    # Returns the oldest pair the user takes part in, if any
+    def get(self, id: str) -> TrackingDto | None:
+        pairs = self._by_user.get(id)
+        if not pairs:
+            return None
+
+        return next(iter(pairs.values()))
+
+    # Returns whether this exact pair object is still being tracked
+    def includes(self, tracking: TrackingDto) -> bool:
+        return self._pairs.get((tracking.id_1, tracking.id_2)) is tracking
+
+    def add(self, tracking: TrackingDto) -> None:
+        key = (tracking.id_1, tracking.id_2)
+        if key in self._pairs:
+            self.remove(self._pairs[key])
+
+        self._pairs[key] = tracking
+        self._by_user.setdefault(tracking.id_1, {})[key] = tracking
+        self._by_user.setdefault(tracking.id_2, {})[key] = tracking
+
+    def remove(self, tracking: TrackingDto) -> None:
+        if not self.includes(tracking):
+            return
+
+        key = (tracking.id_1, tracking.id_2)
+        del self._pairs[key]
+        for id in key:
+            pairs = self._by_user.get(id)
+            if pairs is None:
+                continue
+            pairs.pop(key, None)
+            if not pairs:
+                del self._by_user[id]
@@ -0,0 +1,240 @@
+import logging
+import random
+from typing import Any, Iterator
+
+import config
+from models.user_models import PublicUserDto
+from modules.db import CollectionRef, UserRef
+
+_log = logging.getLogger("uvicorn")
+
+SKIP_LIST_MAX_LEVEL = 32
+SKIP_LIST_P = 0.25
+
+# Every field of PublicUserDto, so seeding never loads password hashes.
+PUBLIC_USER_PROJECTION = {UserRef.HASHED_PASSWORD: 0}
+
+
+class _SkipNode():
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Any, level: int):
+        self.key = key
+        self.next: list[_SkipNode | None] = [None] * level
+        # Number of level 0 steps covered by next[i].
+        self.width: list[int] = [0] * level
+
+
+class IndexableSkipList():
+    """
+    Sorted set of unique, comparable keys with O(log n) insert, remove and
+    rank (number of keys strictly smaller than a given key).
+    """
+
+    def __init__(self, seed: int | None = None):
+        self._head = _SkipNode(None, SKIP_LIST_MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._random = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Any]:
+        node = self._head.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < SKIP_LIST_MAX_LEVEL and self._random.random() < SKIP_LIST_P:
+            level += 1
+        return level
+
+    def insert(self, key: Any) -> None:
+        update = [self._head] * SKIP_LIST_MAX_LEVEL
+        rank = [0] * SKIP_LIST_MAX_LEVEL
+
+        node = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = rank[i + 1] if i + 1 < self._level else 0
+            while node.next[i] is not None and node.next[i].key < key:
+                rank[i] += node.width[i]
+                node = node.next[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.width[i] = self._size
+            self._level = level
+
+        new = _SkipNode(key, level)
+        for i in range(level):
+            new.next[i] = update[i].next[i]
+            update[i].next[i] = new
+            new.width[i] = update[i].width[i] - (rank[0] - rank[i])
+            update[i].width[i] = (rank[0] - rank[i]) + 1
+
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+
+        self._size += 1
+
+    # Returns whether the key was present
+    def remove(self, key: Any) -> bool:
+        update = [self._head] * SKIP_LIST_MAX_LEVEL
+
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+
+        node = node.next[0]
+        if node is None or node.key != key:
+            return False
+
+        for i in range(self._level):
+            if update[i].next[i] is node:
+                update[i].width[i] += node.width[i] - 1
+                update[i].next[i] = node.next[i]
+            else:
+                update[i].width[i] -= 1
+
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+
+        return True
+
+    # Returns how many keys are strictly smaller than 'key'
+    def rank(self, key: Any) -> int:
+        rank = 0
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key < key:
+                rank += node.width[i]
+                node = node.next[i]
+
+        return rank
+
+
+class Leaderboard():
+    """
+    In-process leaderboard ordered by (points desc, name), mirroring the sort the
+    `/leaderboard` routes used to run in Mongo.
+
+    Seeded once at startup with `populate`, then kept up to date by whatever
+    changes points (`add_points`) or other public fields (`update_profile`).
+    """
+
+    def __init__(self):
+        self._order = IndexableSkipList()
+        self._users: dict[str, PublicUserDto] = {}
+        self._keys: dict[str, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    @staticmethod
+    def _key(user: PublicUserDto) -> tuple:
+        return (-user.points, user.name, user.id)
+
+    # Insert or replace a user, including their points
+    def set_user(self, user: PublicUserDto) -> None:
+        user = PublicUserDto.model_validate(user.model_dump(exclude=["hashed_password"]))
+        self.remove_user(user.id)
+
+        key = self._key(user)
+        self._order.insert(key)
+        self._users[user.id] = user
+        self._keys[user.id] = key
+
+    # Replace the public fields of a user, keeping the points already tracked
+    def update_profile(self, user: PublicUserDto) -> None:
+        current = self._users.get(user.id)
+        if current is None:
+            self.set_user(user)
+            return
+
+        points = current.points
+        self.set_user(user)
+        if self._users[user.id].points != points:
+            self._set_points(user.id, points)
+
+    def add_points(self, user_id: str, delta: float) -> None:
+        user = self._users.get(user_id)
+        if user is None or not delta:
+            return
+
+        self._set_points(user_id, user.points + delta)
+
+    def _set_points(self, user_id: str, points: float) -> None:
+        user = self._users[user_id]
+        self._order.remove(self._keys[user_id])
+
+        user.points = points
+        key = self._key(user)
+        self._order.insert(key)
+        self._keys[user_id] = key
+
+    def remove_user(self, user_id: str) -> None:
+        key = self._keys.pop(user_id, None)
+        if key is None:
+            return
+
+        self._order.remove(key)
+        del self._users[user_id]
+
+    # Returns the first 'size' users, most points first
+    def top(self, size: int) -> list[PublicUserDto]:
+        result = []
+        for _, _, user_id in self._order:
+            if len(result) >= size:
+                break
+            result.append(self._users[user_id])
+
+        return result
+
+    # Rank = (# people with more points) + 1, or None for unknown users
+    def rank(self, user_id: str) -> int | None:
+        user = self._users.get(user_id)
+        if user is None:
+            return None
+
+        # ("", "") sorts before every (name, id), so this counts strictly more points.
+        return self._order.rank((-user.points, "", "")) + 1
+
+    def get_points(self, user_id: str) -> float | None:
+        user = self._users.get(user_id)
+        return user.points if user is not None else None
+
+    # Re-read a single user's public fields from Mongo. The points already held
+    # are kept: the stored ones lag behind those buffered or being flushed.
+    async def refresh(self, user_id: str) -> None:
+        user_collection = await config.db.get_collection(CollectionRef.USERS)
+        user = await user_collection.find_one({UserRef.ID: user_id}, PUBLIC_USER_PROJECTION)
+        if user is None:
+            self.remove_user(user_id)
+            return
+
+        self.update_profile(PublicUserDto.model_validate(user))
+
+    # Seed the leaderboard with every user in the database
+    async def populate(self) -> None:
+        user_collection = await config.db.get_collection(CollectionRef.USERS)
+
+        self._order = IndexableSkipList()
+        self._users.clear()
+        self._keys.clear()
+        async for user in user_collection.find({}, PUBLIC_USER_PROJECTION):
+            self.set_user(PublicUserDto.model_validate(user))
+
+        _log.info(f"Leaderboard populated with {len(self._users)} user(s)")
@@ -0,0 +1,21 @@
+import os
+
+from .base import LLMProvider, LLMProviderError
+from .groq_provider import GroqProvider
+from .local import LocalLLMProvider
+
+__all__ = ["LLMProvider", "LLMProviderError", "GroqProvider", "LocalLLMProvider", "create_provider"]
+
+PROVIDERS = {
+    GroqProvider.name: GroqProvider,
+    LocalLLMProvider.name: LocalLLMProvider.from_env,
+}
+
+
+# Create the provider named by LLM_PROVIDER ("groq" by default, or "local")
+def create_provider(name: str | None = None) -> LLMProvider:
+    name = name or os.getenv("LLM_PROVIDER", GroqProvider.name)
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}', expected one of {', '.join(PROVIDERS)}")
+
+    return PROVIDERS[name]()
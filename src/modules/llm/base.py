@@ -0,0 +1,22 @@
+from abc import ABC, abstractmethod
+
+
+class LLMProviderError(Exception):
+    pass
+
+
+class LLMProvider(ABC):
+    """
+    A chat completion backend. Implementations only send a single request,
+    concurrency limits, hedging and retries live in modules.questions.client.
+    """
+
+    name: str
+
+    # Returns the text content of the completion of 'messages'
+    @abstractmethod
+    async def complete(self, messages: list[dict]) -> str:
+        ...
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,32 @@
+import os
+from typing import override
+
+import httpx
+from groq import AsyncGroq
+
+from .base import LLMProvider
+
+GROQ_MODEL = "gemma2-9b-it"
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+
+    def __init__(self, api_key: str | None = None, model: str | None = None):
+        self.model = model or os.getenv("GROQ_MODEL", GROQ_MODEL)
+        self.client = AsyncGroq(
+            api_key=api_key if api_key is not None else os.getenv("GROQ_API_KEY"),
+            timeout=httpx.Timeout(60.0, read=5.0, write=10.0, connect=2.0),
+        )
+
+    @override
+    async def complete(self, messages: list[dict]) -> str:
+        response = await self.client.chat.completions.create(messages=messages, model=self.model)
+        if not response.choices or response.choices[0].message.content is None:
+            return ""
+
+        return response.choices[0].message.content
+
+    @override
+    async def close(self) -> None:
+        await self.client.close()
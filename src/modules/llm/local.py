@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from typing import override
+
+from modules.cache import TTLCache
+
+from .base import LLMProvider, LLMProviderError
+
+# Matches the question lines of modules.questions.generation.MCQ_QUESTION.
+_QUESTION_LINE = re.compile(
+    r"^(?P<index>\d+)\. Question: (?P<question>.*) Correct answer: (?P<answer>.*) Correct answer index: (?P<answer_index>\d)$",
+    re.MULTILINE,
+)
+_NAME = re.compile(r"The person's name is (?P<name>.*?)\. ")
+
+# Attempt counts are only needed while a prompt is being retried, so they are
+# kept for recent prompts only and memory stays flat over long runs.
+ATTEMPTS_CACHE_SIZE = 10_000
+ATTEMPTS_TTL = 60 * 10 # seconds
+
+_DISTRACTORS = [
+    "Something else entirely",
+    "None of the above",
+    "It changes every week",
+    "They'd rather not say",
+    "Pineapple on pizza",
+    "Competitive chess",
+    "Anything but that",
+    "Whatever is on TV",
+]
+
+
+class LocalLLMProvider(LLMProvider):
+    """
+    Offline stand-in that answers the MCQ prompt with valid JSON, so the
+    question pipeline can be run and benchmarked without the network.
+
+    Every response is derived from the prompt, how many times that prompt was
+    sent before and 'seed', so a run is reproducible regardless of how
+    concurrent requests interleave. Latencies follow a log-normal distribution
+    around 'latency' seconds. 'failure_rate' of the requests raise, and each
+    question of a successful response is malformed with 'malformed_rate'.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        latency_sigma: float = 0.5,
+        failure_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+        # Prompt digest -> number of times it was sent recently.
+        self._attempts = TTLCache(max_size=ATTEMPTS_CACHE_SIZE, ttl=ATTEMPTS_TTL)
+
+    @classmethod
+    def from_env(cls, prefix: str = "LOCAL_LLM") -> "LocalLLMProvider":
+        return cls(
+            latency=float(os.getenv(f"{prefix}_LATENCY", 0.2)),
+            latency_sigma=float(os.getenv(f"{prefix}_LATENCY_SIGMA", 0.5)),
+            failure_rate=float(os.getenv(f"{prefix}_FAILURE_RATE", 0.0)),
+            malformed_rate=float(os.getenv(f"{prefix}_MALFORMED_RATE", 0.0)),
+            seed=int(os.getenv(f"{prefix}_SEED", 0)),
+        )
+
+    @override
+    async def complete(self, messages: list[dict]) -> str:
+        prompt = "\n".join(message["content"] for message in messages)
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        attempt = self._attempts.get(digest, 0)
+        self._attempts.set(digest, attempt + 1)
+        rng = random.Random(f"{self.seed}:{digest}:{attempt}")
+
+        if self.latency > 0:
+            await asyncio.sleep(rng.lognormvariate(0, self.latency_sigma) * self.latency)
+        if rng.random() < self.failure_rate:
+            raise LLMProviderError("Simulated local LLM failure")
+
+        name = _NAME.search(prompt)
+        name = name.group("name") if name else "them"
+
+        questions = []
+        for match in _QUESTION_LINE.finditer(prompt):
+            if rng.random() < self.malformed_rate:
+                questions.append({"question_index": int(match.group("index"))})
+                continue
+
+            answer_index = int(match.group("answer_index"))
+            wrong = iter(rng.sample(_DISTRACTORS, 3))
+            questions.append({
+                "question_index": int(match.group("index")),
+                "question_text": f"{match.group('question')} ({name})",
+                "answer_texts": [
+                    {"id": i, "answer_text": match.group("answer") if i == answer_index else next(wrong)}
+                    for i in range(4)
+                ],
+            })
+
+        return json.dumps({"questions": questions})
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+import config
+from modules.cache import TTLCache
+from modules.db import CollectionRef, MCQCacheRef
+
+_log = logging.getLogger("uvicorn")
+
+MCQ_CACHE_SIZE = 10_000
+# Entries only change when the key inputs change, so the in-process tier mostly
+# exists to bound memory; mongod expires the persistent tier on its own.
+MCQ_CACHE_TTL = 60 * 60
+
+
+class MCQCache():
+    """
+    Two-tier cache of generated MCQs: an in-process LRU in front of the
+    `mcq_cache` collection, so a question is only sent to the LLM once for a
+    given (question id, answer, name, answer index).
+
+    Values are plain dicts (a dumped UserQuestionnaireMCQ), keyed by
+    `make_key`. Since the key covers everything in the prompt, edited answers
+    or names simply miss; `invalidate_user` only frees what is left behind.
+    """
+
+    def __init__(self, max_size: int = MCQ_CACHE_SIZE, ttl: float = MCQ_CACHE_TTL):
+        self.memory = TTLCache(max_size=max_size, ttl=ttl)
+
+        self.store_hits = 0
+        self.store_misses = 0
+        self.stored = 0
+
+    @staticmethod
+    def make_key(question_id: int, answer: str, name: str, answer_index: int) -> str:
+        inputs = json.dumps([question_id, answer, name, answer_index], ensure_ascii=False)
+        return hashlib.sha256(inputs.encode()).hexdigest()
+
+    # Returns the cached MCQs among 'keys', reading the collection only for
+    # those not in memory (in a single query)
+    async def get_many(self, keys: list[str]) -> dict[str, dict]:
+        found = {}
+        missing = []
+        for key in keys:
+            entry = self.memory.get(key)
+            if entry is None:
+                missing.append(key)
+            else:
+                found[key] = entry[MCQCacheRef.MCQ]
+
+        if not missing:
+            return found
+
+        mcq_collection = await config.db.get_collection(CollectionRef.MCQ_CACHE)
+        async for entry in mcq_collection.find({MCQCacheRef.ID: {"$in": missing}}):
+            key = entry.pop(MCQCacheRef.ID)
+            self.memory.set(key, entry)
+            found[key] = entry[MCQCacheRef.MCQ]
+
+        self.store_hits += sum(1 for key in missing if key in found)
+        self.store_misses += sum(1 for key in missing if key not in found)
+
+        return found
+
+    # Store freshly generated MCQs about 'user_id' in both tiers
+    async def set_many(self, user_id: str, mcqs: dict[str, dict]) -> None:
+        if not mcqs:
+            return
+
+        now = datetime.now(timezone.utc)
+        operations = []
+        for key, mcq in mcqs.items():
+            entry = {MCQCacheRef.USER: user_id, MCQCacheRef.MCQ: mcq, MCQCacheRef.CREATED: now}
+            self.memory.set(key, entry)
+            operations.append(UpdateOne({MCQCacheRef.ID: key}, {"$set": entry}, upsert=True))
+
+        mcq_collection = await config.db.get_collection(CollectionRef.MCQ_CACHE)
+        await mcq_collection.bulk_write(operations, ordered=False)
+        self.stored += len(operations)
+
+    # Drop every MCQ generated about 'user_id', in memory and in the collection
+    async def invalidate_user(self, user_id: str) -> None:
+        self.memory.invalidate_where(lambda _, entry: entry[MCQCacheRef.USER] == user_id)
+
+        mcq_collection = await config.db.get_collection(CollectionRef.MCQ_CACHE)
+        result = await mcq_collection.delete_many({MCQCacheRef.USER: user_id})
+        _log.debug(f"Invalidated {result.deleted_count} cached MCQ(s) about user {user_id}")
+
+    def stats(self) -> dict:
+        lookups = self.store_hits + self.store_misses
+        return {
+            "memory": self.memory.stats(),
+            "store_hits": self.store_hits,
+            "store_misses": self.store_misses,
+            "store_hit_ratio": self.store_hits / lookups if lookups else 0.0,
+            "stored": self.stored,
+        }
@@ -0,0 +1,260 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, Coroutine
+
+from bson.binary import Binary
+from pymongo import ReplaceOne, ReturnDocument
+
+import config
+from modules.db import CollectionRef, PictureChunkRef, PictureRef
+from modules.db.monitoring import RouteTag, route_scope
+from modules.thumbnails import THUMBNAIL_SIZES, make_thumbnails
+from modules.workers import WorkerPool
+
+_log = logging.getLogger("uvicorn")
+
+# Thumbnails are generated in separate processes by default. Configure with
+# THUMBNAIL_POOL_KIND, THUMBNAIL_POOL_WORKERS and THUMBNAIL_POOL_MAX_CONCURRENCY.
+thumbnail_pool = WorkerPool.from_env("thumbnail", "THUMBNAIL_POOL", kind="process")
+# Keeps references to running background jobs so they aren't garbage collected.
+_jobs: set[asyncio.Task] = set()
+
+# Routes the database commands of background jobs are attributed to.
+VARIANTS_ROUTE = "picture variants"
+CHUNK_GC_ROUTE = "picture chunk gc"
+
+# Seconds chunks no longer referenced are kept before being deleted, so
+# downloads that started before a new upload can finish.
+PICTURE_GC_DELAY = 60
+
+# Chunks stay well below the 16MB document limit and are streamed one by one.
+PICTURE_CHUNK_SIZE = 255 * 1024
+
+_MAGIC_NUMBERS = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+# Decode a base64 picture as sent by clients, with or without a
+# "data:image/...;base64," prefix. Raises ValueError if it isn't valid base64.
+def decode_picture(picture: str) -> bytes:
+    if picture.startswith("data:") and "," in picture:
+        picture = picture.split(",", 1)[1]
+
+    try:
+        return base64.b64decode(picture, validate=True)
+    except binascii.Error as e:
+        raise ValueError("Picture is not valid base64") from e
+
+
+def detect_content_type(data: bytes) -> str:
+    for magic, content_type in _MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+
+    return "application/octet-stream"
+
+
+# Write 'data' as chunk documents keyed by (user, hash) and return the picture
+# metadata describing them. Nothing points at the chunks yet.
+async def write_chunks(user_id: str, data: bytes) -> dict:
+    chunk_collection = await config.db.get_collection(CollectionRef.PICTURE_CHUNKS)
+    digest = hashlib.sha256(data).hexdigest()
+
+    chunks = [
+        {
+            PictureChunkRef.USER: user_id,
+            PictureChunkRef.HASH: digest,
+            PictureChunkRef.N: n,
+            PictureChunkRef.DATA: Binary(data[start:start + PICTURE_CHUNK_SIZE]),
+        }
+        for n, start in enumerate(range(0, len(data), PICTURE_CHUNK_SIZE))
+    ]
+    # The same picture may already be stored and served. Its chunks are
+    # identical, so they are left alone if complete, or upserted in place,
+    # never deleted first, which would truncate a concurrent download.
+    existing = await chunk_collection.count_documents({PictureChunkRef.USER: user_id, PictureChunkRef.HASH: digest})
+    if chunks and existing != len(chunks):
+        await chunk_collection.bulk_write(
+            [
+                ReplaceOne(
+                    {PictureChunkRef.USER: user_id, PictureChunkRef.HASH: digest, PictureChunkRef.N: chunk[PictureChunkRef.N]},
+                    chunk,
+                    upsert=True,
+                )
+                for chunk in chunks
+            ],
+            ordered=False,
+        )
+
+    return {
+        PictureRef.HASH: digest,
+        PictureRef.CONTENT_TYPE: detect_content_type(data),
+        PictureRef.LENGTH: len(data),
+        PictureRef.CHUNKS: len(chunks),
+    }
+
+
+# Hashes of the chunks a picture document references: the original and its
+# variants
+def picture_hashes(meta: dict | None) -> set[str]:
+    if meta is None or PictureRef.HASH not in meta:
+        return set()
+    return {meta[PictureRef.HASH]} | {variant[PictureRef.HASH] for variant in meta.get(PictureRef.VARIANTS, {}).values()}
+
+
+# Delete the chunks of 'hashes' after PICTURE_GC_DELAY seconds, except those
+# the user's picture document references again by then (the old picture was
+# uploaded back)
+async def delete_dead_chunks(user_id: str, hashes: set[str]) -> None:
+    await asyncio.sleep(PICTURE_GC_DELAY)
+
+    picture_collection = await config.db.get_collection(CollectionRef.PICTURES)
+    chunk_collection = await config.db.get_collection(CollectionRef.PICTURE_CHUNKS)
+    meta = await picture_collection.find_one({PictureRef.USER: user_id})
+    dead = hashes - picture_hashes(meta)
+    if dead:
+        await chunk_collection.delete_many({PictureChunkRef.USER: user_id, PictureChunkRef.HASH: {"$in": list(dead)}})
+
+
+# Store a user's picture as raw binary chunks and point their picture
+# document at it, then queue generation of its resized variants and deletion
+# of the picture it replaced. Returns the new metadata.
+async def store_picture(user_id: str, data: bytes) -> dict:
+    picture_collection = await config.db.get_collection(CollectionRef.PICTURES)
+
+    meta = await write_chunks(user_id, data)
+    meta[PictureRef.UPDATED] = datetime.now(timezone.utc)
+    digest = meta[PictureRef.HASH]
+
+    # Same picture uploaded again: its chunks and variants are still valid.
+    current = await picture_collection.find_one_and_update(
+        {PictureRef.USER: user_id, PictureRef.HASH: digest},
+        {"$set": {PictureRef.UPDATED: meta[PictureRef.UPDATED]}},
+        projection={PictureRef.VARIANTS: 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if current is not None:
+        if PictureRef.VARIANTS not in current:
+            schedule_variants(user_id, data, digest)
+        return meta
+
+    previous = await picture_collection.find_one_and_update(
+        {PictureRef.USER: user_id},
+        {"$set": meta, "$unset": {PictureRef.PICTURE: "", PictureRef.VARIANTS: ""}},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+    schedule_variants(user_id, data, digest)
+    dead = picture_hashes(previous) - {digest}
+    if dead:
+        schedule_chunk_gc(user_id, dead)
+
+    return meta
+
+
+# Generate every thumbnail of a picture off the event loop and store them next
+# to the original. Skipped if the user uploaded another picture in the meantime.
+async def generate_variants(user_id: str, data: bytes, digest: str) -> None:
+    picture_collection = await config.db.get_collection(CollectionRef.PICTURES)
+
+    thumbnails = await thumbnail_pool.run(make_thumbnails, data, THUMBNAIL_SIZES)
+    variants = {str(size): await write_chunks(user_id, thumbnail) for size, thumbnail in thumbnails.items()}
+
+    result = await picture_collection.update_one(
+        {PictureRef.USER: user_id, PictureRef.HASH: digest},
+        {"$set": {PictureRef.VARIANTS: variants}},
+    )
+    if not result.matched_count:
+        # A newer picture replaced this one, its thumbnails are only kept if
+        # that picture references them too.
+        schedule_chunk_gc(user_id, {variant[PictureRef.HASH] for variant in variants.values()} - {digest})
+        return
+
+    _log.debug(f"Generated {len(variants)} picture variant(s) for user {user_id}")
+
+
+async def _run_variants(user_id: str, data: bytes, digest: str) -> None:
+    # Scheduled from the upload request, but its queries shouldn't count towards it.
+    with route_scope(RouteTag(VARIANTS_ROUTE)):
+        await generate_variants(user_id, data, digest)
+
+
+async def _run_chunk_gc(user_id: str, hashes: set[str]) -> None:
+    with route_scope(RouteTag(CHUNK_GC_ROUTE)):
+        await delete_dead_chunks(user_id, hashes)
+
+
+def _schedule(job: Coroutine, what: str) -> None:
+    task = asyncio.create_task(job)
+    _jobs.add(task)
+    task.add_done_callback(lambda task: _on_job_done(task, what))
+
+
+def _on_job_done(task: asyncio.Task, what: str) -> None:
+    _jobs.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        _log.error(f"Failed to {what}", exc_info=task.exception())
+
+
+def schedule_variants(user_id: str, data: bytes, digest: str) -> None:
+    _schedule(_run_variants(user_id, data, digest), "generate picture variants")
+
+
+def schedule_chunk_gc(user_id: str, hashes: set[str]) -> None:
+    _schedule(_run_chunk_gc(user_id, hashes), "delete picture chunks")
+
+
+# Returns the metadata of the 'size' variant, or of the original if that variant
+# doesn't exist (not generated yet, or the original is already smaller)
+def select_variant(meta: dict, size: int | None) -> dict:
+    if size is None:
+        return meta
+
+    variant = meta.get(PictureRef.VARIANTS, {}).get(str(size))
+    return variant if variant is not None else meta
+
+
+# Returns the picture document of a user, or None. Pictures still stored in the
+# legacy base64 format are migrated to binary chunks on the way.
+async def get_picture_meta(user_id: str) -> dict | None:
+    picture_collection = await config.db.get_collection(CollectionRef.PICTURES)
+    meta = await picture_collection.find_one({PictureRef.USER: user_id})
+    if meta is None:
+        return None
+
+    if PictureRef.HASH not in meta and meta.get(PictureRef.PICTURE):
+        try:
+            data = decode_picture(meta[PictureRef.PICTURE])
+        except ValueError:
+            _log.warning(f"Legacy picture of user {user_id} is not valid base64")
+            return None
+
+        _log.info(f"Migrating legacy picture of user {user_id} to binary storage")
+        meta.update(await store_picture(user_id, data))
+
+    if PictureRef.HASH not in meta:
+        return None
+
+    return meta
+
+
+# Yields the bytes of a stored picture one chunk at a time
+async def iter_picture(user_id: str, digest: str) -> AsyncIterator[bytes]:
+    chunk_collection = await config.db.get_collection(CollectionRef.PICTURE_CHUNKS)
+    cursor = chunk_collection.find(
+        {PictureChunkRef.USER: user_id, PictureChunkRef.HASH: digest},
+        {PictureChunkRef.DATA: 1},
+    ).sort(PictureChunkRef.N, 1).batch_size(4)
+
+    async for chunk in cursor:
+        yield bytes(chunk[PictureChunkRef.DATA])
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+try:
+    import fcntl
+except ImportError: # Windows, journal locking is skipped
+    fcntl = None
+
+import config
+from modules.db import CollectionRef, UserRef
+
+# Seconds between two flushes, and number of users with pending points that
+# triggers one early.
+POINTS_FLUSH_INTERVAL = 5
+POINTS_FLUSH_MAX_PENDING = 5_000
+POINTS_JOURNAL_PATH = "points.journal"
+
+_log = logging.getLogger("uvicorn")
+
+
+class PointsBuffer():
+    """
+    Write-behind accumulator of point awards. Deltas from every source (tracker
+    ticks, MCQs, achievements) are summed per user in process and written to
+    Mongo as one unordered bulk write of `$inc`, every 'flush_interval' seconds
+    or as soon as 'max_pending' users have points pending, so writes scale with
+    active users rather than with awards.
+
+    The leaderboard is updated as soon as points are added. Each `add_many` is
+    appended as one JSON line to the journal at 'journal_path', which is
+    replayed by `replay()` on startup so points awarded before a crash aren't
+    lost. A delta is applied at least once: a crash between a bulk write and the
+    removal of its journal applies it again on replay.
+
+    The journal belongs to one process: it is moved aside and removed while
+    flushing, so a second worker sharing it would lose or replay the deltas of
+    the first. An exclusive lock on 'journal_path'.lock is taken by `replay()`
+    (or the first journaled add) and held until `close()`, and a second process
+    fails with a RuntimeError. With several workers, give each its own
+    POINTS_JOURNAL_PATH.
+
+    Not thread safe; meant to be used from the event loop only.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = POINTS_FLUSH_INTERVAL,
+        max_pending: int = POINTS_FLUSH_MAX_PENDING,
+        journal_path: str | None = POINTS_JOURNAL_PATH,
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.journal_path = journal_path
+        self.pending: dict[str, float] = {}
+        self._journal = None
+        self._lock_file = None
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        self.added = 0
+        self.flushes = 0
+        self.failed = 0
+        self.operations = 0
+        self.replayed = 0
+        self.last_flush_at: datetime | None = None
+        self.last_flush_latency = 0.0
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "PointsBuffer":
+        flush_interval = os.getenv(f"{prefix}_FLUSH_INTERVAL")
+        max_pending = os.getenv(f"{prefix}_FLUSH_MAX_PENDING")
+        return cls(
+            flush_interval=float(flush_interval) if flush_interval else POINTS_FLUSH_INTERVAL,
+            max_pending=int(max_pending) if max_pending else POINTS_FLUSH_MAX_PENDING,
+            # An empty path disables the journal.
+            journal_path=os.getenv(f"{prefix}_JOURNAL_PATH", POINTS_JOURNAL_PATH) or None,
+        )
+
+    @property
+    def _flushing_path(self) -> str:
+        return self.journal_path + ".flushing"
+
+    # Take the lock of the journal for the lifetime of the process
+    def _lock_journal(self) -> None:
+        if self._lock_file is not None or fcntl is None:
+            return
+
+        lock_file = open(self.journal_path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                f"Points journal {self.journal_path} is in use by another process, "
+                "set POINTS_JOURNAL_PATH to a different path for each worker"
+            )
+        self._lock_file = lock_file
+
+    def _write_journal(self, deltas: dict[str, float]) -> None:
+        if self.journal_path is None:
+            return
+        self._lock_journal()
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a")
+        # Flushed to the OS right away so the line survives the process dying.
+        self._journal.write(json.dumps(deltas, separators=(",", ":")) + "\n")
+        self._journal.flush()
+
+    def add(self, user_id: str, points: float) -> None:
+        self.add_many({user_id: points})
+
+    # Queue 'deltas' (user ID -> points) for the next flush
+    def add_many(self, deltas: dict[str, float]) -> None:
+        deltas = {user_id: points for user_id, points in deltas.items() if points}
+        if not deltas:
+            return
+
+        self._write_journal(deltas)
+        for user_id, points in deltas.items():
+            self.pending[user_id] = self.pending.get(user_id, 0) + points
+            if config.leaderboard is not None:
+                config.leaderboard.add_points(user_id, points)
+        self.added += len(deltas)
+
+        if len(self.pending) >= self.max_pending:
+            self._flush_requested.set()
+
+    # Drop the pending points of a deleted user. Its journal lines are harmless,
+    # `$inc` on a missing user matches nothing.
+    def discard(self, user_id: str) -> None:
+        self.pending.pop(user_id, None)
+
+    # Put deltas that failed to be written back in the queue and journal
+    def _requeue(self, deltas: dict[str, float]) -> None:
+        for user_id, points in deltas.items():
+            self.pending[user_id] = self.pending.get(user_id, 0) + points
+        self._write_journal(deltas)
+
+    # Write every pending delta to Mongo. The journal is moved aside for the
+    # duration of the write, and deltas that failed to be written are journaled
+    # again before it is removed.
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            self._flush_requested.clear()
+            if not self.pending:
+                return 0
+
+            pending, self.pending = self.pending, {}
+            journaled = self.journal_path is not None and os.path.exists(self.journal_path)
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if journaled:
+                os.replace(self.journal_path, self._flushing_path)
+
+            user_ids = list(pending)
+            operations = [
+                UpdateOne({UserRef.ID: user_id}, {"$inc": {UserRef.POINTS: pending[user_id]}})
+                for user_id in user_ids
+            ]
+            user_collection = await config.db.get_collection(CollectionRef.USERS)
+            start = time.perf_counter()
+            applied = len(operations)
+            try:
+                await user_collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Unordered, so every operation but the failed ones was applied.
+                failed = {user_ids[error["index"]]: pending[user_ids[error["index"]]] for error in e.details["writeErrors"]}
+                applied -= len(failed)
+                self.failed += 1
+                _log.error(f"Failed to flush points of {len(failed)} user(s), retrying on the next flush: {e.details['writeErrors'][:1]}")
+                self._requeue(failed)
+            except Exception:
+                # Nothing is known to be applied. A connection lost mid-write
+                # may have applied some, which are then applied again.
+                self.failed += 1
+                _log.exception(f"Failed to flush points of {len(operations)} user(s), retrying on the next flush")
+                self._requeue(pending)
+                return 0
+            finally:
+                if journaled:
+                    os.remove(self._flushing_path)
+
+            self.last_flush_latency = time.perf_counter() - start
+            self.last_flush_at = datetime.now(timezone.utc)
+            self.flushes += 1
+            self.operations += applied
+            if config.user_cache is not None:
+                config.user_cache.invalidate(*pending)
+            _log.debug(f"Flushed points of {applied} user(s) in {self.last_flush_latency * 1000:.1f}ms")
+
+            return applied
+
+    # Queue the deltas of a journal left behind by a previous run and write them
+    # out. Leaderboard points are read from Mongo afterwards, so it isn't touched.
+    async def replay(self) -> None:
+        if self.journal_path is None:
+            return
+        self._lock_journal()
+
+        replayed: dict[str, float] = {}
+        for path in (self._flushing_path, self.journal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    try:
+                        deltas = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn last line of a crashed write.
+                        _log.warning(f"Skipping corrupt line in points journal {path}")
+                        continue
+                    for user_id, points in deltas.items():
+                        replayed[user_id] = replayed.get(user_id, 0) + points
+
+        if not replayed:
+            return
+
+        # Compact both files into one journal before writing to Mongo.
+        with open(self.journal_path + ".tmp", "w") as f:
+            f.write(json.dumps(replayed, separators=(",", ":")) + "\n")
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+        if os.path.exists(self._flushing_path):
+            os.remove(self._flushing_path)
+
+        for user_id, points in replayed.items():
+            self.pending[user_id] = self.pending.get(user_id, 0) + points
+        self.replayed = len(replayed)
+        _log.info(f"Replaying journaled points of {len(replayed)} user(s)")
+        await self.flush()
+
+    # Flush every 'flush_interval' seconds, or earlier once enough users have
+    # points pending
+    async def start_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                _log.exception("Points flush failed")
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def stats(self) -> dict:
+        return {
+            "pending_users": len(self.pending),
+            "pending_points": sum(self.pending.values()),
+            "added": self.added,
+            "flushes": self.flushes,
+            "failed": self.failed,
+            "operations": self.operations,
+            "replayed": self.replayed,
+            "last_flush_at": self.last_flush_at,
+            "last_flush_latency": self.last_flush_latency,
+        }
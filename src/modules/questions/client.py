@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+
+import config
+
+_log = logging.getLogger("uvicorn")
+
+# Latencies the hedging budget is computed from, and how many are needed first.
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 0.95
+
+
+class LLMClient():
+    """
+    Sends chat completions with a global limit on concurrent upstream requests.
+
+    Requests beyond 'max_concurrency' wait for a free slot; how long is
+    recorded in `stats()`. Once enough latencies are known, a request still
+    running after the p95 latency is hedged with a duplicate one, the first
+    response wins and the other is cancelled.
+    """
+
+    def __init__(self, max_concurrency: int = 8, hedging: bool = True):
+        self.max_concurrency = max_concurrency
+        self.hedging = hedging
+        self._semaphore: asyncio.Semaphore | None = None
+        # Upstream latency of successful requests, excluding time spent queued.
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+        self.queued = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.failed = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "LLMClient":
+        max_concurrency = os.getenv(f"{prefix}_MAX_CONCURRENCY")
+        return cls(
+            max_concurrency=int(max_concurrency) if max_concurrency else 8,
+            hedging=os.getenv(f"{prefix}_HEDGING", "true").lower() != "false",
+        )
+
+    # Returns the latency after which a request gets hedged, or None if there
+    # isn't enough history yet
+    def hedge_delay(self) -> float | None:
+        if not self.hedging or len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, math.ceil(HEDGE_PERCENTILE * len(latencies)) - 1)]
+
+    # Returns the content of the completion of 'messages'
+    async def complete(self, messages: list[dict]) -> str:
+        started = asyncio.Event()
+        first = asyncio.create_task(self._request(messages, started))
+        pending = {first}
+        try:
+            if self.hedge_delay() is not None:
+                # The budget only counts time spent upstream, not queued.
+                waiter = asyncio.create_task(started.wait())
+                try:
+                    await asyncio.wait({first, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+
+                delay = self.hedge_delay()
+                if not first.done() and delay is not None:
+                    done, _ = await asyncio.wait(pending, timeout=delay)
+                    if not done:
+                        self.hedges += 1
+                        pending.add(asyncio.create_task(self._request(messages)))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _request(self, messages: list[dict], started: asyncio.Event | None = None) -> str:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        queued_at = time.perf_counter()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        wait = started_at - queued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_flight += 1
+        self.requests += 1
+        if started is not None:
+            started.set()
+        try:
+            content = await config.llm.complete(messages)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+        self._latencies.append(time.perf_counter() - started_at)
+        return content
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failed": self.failed,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay": self.hedge_delay(),
+            "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+            "max_wait": self.max_wait,
+        }
@@ -0,0 +1,212 @@
+# Generation of the MCQs a user answers about another user. Used by the
+# questions routes and prefetched by modules.questions.prefetch while a catch
+# is in progress.
+
+import hashlib
+import json
+import logging
+import random
+
+import config
+from models.question_models import UserQuestionnaireAnswer, UserQuestionnaireMCQ
+from models.user_models import UserDto
+from modules.questions.client import LLMClient
+
+_log = logging.getLogger("uvicorn")
+
+# Shared by every MCQ generation. Configure with LLM_MAX_CONCURRENCY and
+# LLM_HEDGING.
+mcq_client = LLMClient.from_env("LLM")
+
+
+class MCQGenerationError(Exception):
+    pass
+
+
+MCQ_QUERY = """
+You need to generate four multiple choice answers for each of the questions below.
+You are generating these questions for another person who has just met the person that this questionnaire is about, so you should ensure that the answers are something that the guessing person could guess.
+The person's name is {name}. Change the questions to be about {name} instead of second person.
+For every question, generate three wrong answers and one correct answer.
+The questions, each with its index, the correct answer and the index the correct answer must be put at:
+{questions}
+You will need to return a json object with the following format for example:
+```json
+{{
+    "questions": [
+        {{
+            "question_index": 0,
+            "question_text": "What is Jeremy's favourite video game?",
+            "answer_texts": [
+                {{
+                    "id": 0,
+                    "answer_text": "Fortnite"
+                }},
+                {{
+                    "id": 1,
+                    "answer_text": "Counter-Strike"
+                }},
+                {{
+                    "id": 2,
+                    "answer_text": "Call of Duty"
+                }},
+                {{
+                    "id": 3,
+                    "answer_text": "Valorant"
+                }}
+            ]
+        }}
+    ]
+}}
+```
+Where question_index is the index of the question in the list above, and id is 0-indexed.
+There must be one entry in "questions" for every question in the list above.
+You must put the correct answer of every question at its given index and the wrong answers at the other indexes.
+You may make the three other wrong answers similar to the correct answer to make it harder but it must be clear that they are wrong.
+Do note include ``` code blocks in the response.
+Do note say ANYTHING ELSE in the response either, must only be the json content.
+"""
+MCQ_QUESTION = "{index}. Question: {question} Correct answer: {answer} Correct answer index: {answer_index}"
+
+# Parsing failures are retried for the failed questions only, at most this many
+# requests in total.
+MAX_ATTEMPTS = 3
+
+# Changing the order of these questions will also change the order of the
+# question IDs... so don't change their order.
+QUESTIONS = [
+    "What course are you studying?",
+    "What's your favourite TV Show?",
+    "Do you play any sports?",
+    "Do you play any video games?",
+    "What's your type?",
+    "What's your spice tolerance?",
+    "What's your best pickup line?",
+    "What's your biggest ick?",
+    "What's a green flag you look for?",
+    "What's a red flag you avoid?",
+    "What's your love language?",
+    "What's your number 1 artist?",
+    "What's your favourite cuisine?",
+    "What's your favourite way to spend a day off?",
+    "What's your favourite unit at Monash?",
+]
+
+
+def hash_string_to_int(_string: str) -> int:
+    """
+    Hash a string to an integer using SHA-256.
+    """
+    return int(hashlib.sha256(_string.encode()).hexdigest(), 16)
+
+def get_unique_answer_seq(id_1: str, id_2: str, unique_state: int) -> list[int]:
+    """
+    Generate a sequence 3 unique numbers from 0 to 3.
+    The sequence will be used to generate the answer options for the MCQ.
+
+    Will be consistent for the same two users.
+
+    args:
+        id_1: The UUID of the first user.
+        id_2: The UUID of the first user.
+    """
+    seed = hash_string_to_int(id_1 + id_2) + unique_state % 1000000
+    random.seed(seed)
+
+    seq = random.sample(range(4), 3)
+
+    return seq
+
+
+# Returns the parsed MCQ of every entry of a batched response, by question
+# index. Malformed entries are left out so only they get retried.
+def parse_mcq_batch(content: str, question_ids: dict[int, int]) -> dict[int, UserQuestionnaireMCQ]:
+    content = content.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+    try:
+        entries = json.loads(content)["questions"]
+    except (ValueError, KeyError, TypeError):
+        return {}
+    if not isinstance(entries, list):
+        return {}
+
+    parsed = {}
+    for entry in entries:
+        try:
+            index = entry["question_index"]
+            options = [
+                UserQuestionnaireAnswer(id=option["id"], answerText=option["answer_text"])
+                for option in entry["answer_texts"]
+            ]
+            mcq = UserQuestionnaireMCQ(id=question_ids[index], questionText=entry["question_text"], options=options)
+        except (ValueError, KeyError, TypeError):
+            continue
+
+        if sorted(option.id for option in mcq.options) == [0, 1, 2, 3]:
+            parsed[index] = mcq
+
+    return parsed
+
+
+# Returns the MCQs 'asker' has to answer about 'subject', in the order of the
+# subject's questions. Raises MCQGenerationError if the LLM output is unusable.
+async def generate_mcqs(asker: UserDto, subject: UserDto) -> list[UserQuestionnaireMCQ]:
+    answer_seq = get_unique_answer_seq(
+        asker.id,
+        subject.id,
+        asker.questions_answered
+    )
+
+    # Each question is cached on everything its prompt depends on, so the same
+    # pair of users (or any asker landing on the same answer index) reuses it.
+    cache_keys = [
+        config.mcq_cache.make_key(question.id, question.answer, subject.name, answer_seq[i])
+        for i, question in enumerate(subject.questions)
+    ]
+    cached = await config.mcq_cache.get_many(cache_keys)
+
+    # All questions that weren't cached go to the LLM in a single prompt. Whatever
+    # fails to parse is asked again, on its own.
+    missing = [i for i, key in enumerate(cache_keys) if key not in cached]
+    question_ids = {i: subject.questions[i].id for i in missing}
+    generated: dict[int, UserQuestionnaireMCQ] = {}
+    for attempt in range(MAX_ATTEMPTS):
+        if len(generated) == len(missing):
+            break
+
+        remaining = [i for i in missing if i not in generated]
+        prompt = MCQ_QUERY.format(
+            name=subject.name,
+            questions="\n".join(
+                MCQ_QUESTION.format(
+                    index=i,
+                    question=QUESTIONS[subject.questions[i].id],
+                    answer=subject.questions[i].answer,
+                    answer_index=answer_seq[i],
+                )
+                for i in remaining
+            ),
+        )
+        try:
+            content = await mcq_client.complete([{"role": "user", "content": prompt}])
+        except Exception:
+            _log.warning(f"MCQ generation request failed (attempt {attempt + 1}/{MAX_ATTEMPTS})", exc_info=True)
+            continue
+
+        parsed = parse_mcq_batch(content, {i: question_ids[i] for i in remaining})
+        generated.update(parsed)
+        if len(parsed) < len(remaining):
+            _log.warning(f"Failed to parse {len(remaining) - len(parsed)} MCQ(s) from the LLM (attempt {attempt + 1}/{MAX_ATTEMPTS})")
+
+    if len(generated) < len(missing):
+        raise MCQGenerationError("Failed to generate MCQ from the LLM.")
+
+    await config.mcq_cache.set_many(
+        subject.id, {cache_keys[i]: mcq.model_dump() for i, mcq in generated.items()}
+    )
+
+    questions_answers = [
+        generated[i] if i in generated else UserQuestionnaireMCQ.model_validate(cached[key])
+        for i, key in enumerate(cache_keys)
+    ]
+
+    return questions_answers
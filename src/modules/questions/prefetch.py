@@ -0,0 +1,116 @@
+import asyncio
+import logging
+
+import config
+from models.question_models import UserQuestionnaireMCQ
+from models.user_models import UserDto
+from modules.db import CollectionRef, UserRef
+from modules.db.monitoring import RouteTag, route_scope
+from modules.questions.generation import generate_mcqs
+
+_log = logging.getLogger("uvicorn")
+
+# Route the database commands of prefetch tasks are attributed to.
+PREFETCH_ROUTE = "mcq prefetch"
+
+
+class MCQPrefetcher():
+    """
+    Background MCQ generation for tracked pairs, so `/questions/mcq/generate`
+    doesn't wait on the LLM once the catch is over.
+
+    One task per direction (asker, subject) is started when tracking begins
+    and kept until it ends. A result is only handed out if the asker's
+    `questions_answered` hasn't changed since, as it seeds the answer order.
+    """
+
+    def __init__(self):
+        # (asker, subject) -> task returning (asker's questions_answered, MCQs)
+        self._tasks: dict[tuple[str, str], asyncio.Task] = {}
+
+        self.started = 0
+        self.served = 0
+        self.joined = 0
+        self.stale = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    # Start generating the MCQs of both users of a tracked pair about each other
+    def start(self, id_1: str, id_2: str) -> None:
+        for asker_id, subject_id in ((id_1, id_2), (id_2, id_1)):
+            self.cancel_direction(asker_id, subject_id)
+
+            task = asyncio.create_task(self._prefetch(asker_id, subject_id))
+            task.add_done_callback(self._on_done)
+            self._tasks[(asker_id, subject_id)] = task
+            self.started += 1
+
+    # Drop everything prefetched for a pair, cancelling what is still running
+    def cancel(self, id_1: str, id_2: str) -> None:
+        self.cancel_direction(id_1, id_2)
+        self.cancel_direction(id_2, id_1)
+
+    def cancel_direction(self, asker_id: str, subject_id: str) -> None:
+        task = self._tasks.pop((asker_id, subject_id), None)
+        if task is not None and not task.done():
+            task.cancel()
+            self.cancelled += 1
+
+    # Returns the prefetched MCQs of 'asker' about 'subject_id', waiting for the
+    # task if it is still running. None if there is nothing usable, in which case
+    # the caller generates them itself.
+    async def get(self, asker: UserDto, subject_id: str) -> list[UserQuestionnaireMCQ] | None:
+        task = self._tasks.get((asker.id, subject_id))
+        if task is None:
+            return None
+
+        if not task.done():
+            self.joined += 1
+        try:
+            # Shielded so a client disconnecting doesn't cancel the shared task.
+            questions_answered, mcqs = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                return None
+            raise
+        except Exception:
+            return None
+
+        if questions_answered != asker.questions_answered:
+            self.stale += 1
+            return None
+
+        self.served += 1
+        return mcqs
+
+    async def _prefetch(self, asker_id: str, subject_id: str) -> tuple[int, list[UserQuestionnaireMCQ]]:
+        # Started from a request, but its queries shouldn't count towards it.
+        with route_scope(RouteTag(PREFETCH_ROUTE)):
+            user_collection = await config.db.get_collection(CollectionRef.USERS)
+            users = {}
+            async for document in user_collection.find({UserRef.ID: {"$in": [asker_id, subject_id]}}):
+                user = UserDto.model_validate(document)
+                users[user.id] = user
+            asker, subject = users[asker_id], users[subject_id]
+
+            return asker.questions_answered, await generate_mcqs(asker, subject)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+            _log.warning("Failed to prefetch MCQs", exc_info=task.exception())
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": sum(1 for task in self._tasks.values() if not task.done()),
+            "ready": sum(1 for task in self._tasks.values() if task.done()),
+            "started": self.started,
+            "served": self.served,
+            "joined": self.joined,
+            "stale": self.stale,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+        }
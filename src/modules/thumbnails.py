@@ -0,0 +1,36 @@
+# Image resizing for profile picture variants. Everything here is plain CPU
+# work with no database access, so it can run in a process pool.
+
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Longest side, in pixels, of every variant generated for a profile picture.
+THUMBNAIL_SIZES = (64, 128, 256)
+JPEG_QUALITY = 85
+
+
+# Decode 'data' once and return an encoded thumbnail per requested size. Images
+# with transparency are encoded as PNG, everything else as JPEG. Sizes larger
+# than the original are skipped.
+def make_thumbnails(data: bytes, sizes: tuple[int, ...] = THUMBNAIL_SIZES) -> dict[int, bytes]:
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    thumbnails = {}
+    # Largest first, each size is downscaled from the previous one.
+    for size in sorted(sizes, reverse=True):
+        if max(image.size) <= size:
+            continue
+
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        output = BytesIO()
+        if has_alpha:
+            image.save(output, format="PNG", optimize=True)
+        else:
+            image.save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        thumbnails[size] = output.getvalue()
+
+    return thumbnails
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class WorkerPool():
+    """
+    Runs blocking (CPU heavy) functions in a thread or process pool so they
+    never block the event loop.
+
+    At most 'max_concurrency' calls are submitted at once, anything beyond
+    that waits in an asyncio queue. How long calls wait there and how long they
+    take to run is recorded and returned by `stats()`.
+    """
+
+    def __init__(self, name: str, kind: str = "thread", workers: int | None = None, max_concurrency: int | None = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown worker pool kind '{kind}', expected 'thread' or 'process'")
+
+        self.name = name
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.workers
+        self._executor: Executor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, kind: str = "thread") -> "WorkerPool":
+        workers = os.getenv(f"{prefix}_WORKERS")
+        max_concurrency = os.getenv(f"{prefix}_MAX_CONCURRENCY")
+        return cls(
+            name,
+            kind=os.getenv(f"{prefix}_KIND", kind),
+            workers=int(workers) if workers else None,
+            max_concurrency=int(max_concurrency) if max_concurrency else None,
+        )
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    # Run 'func(*args)' in the pool, waiting for a free slot first
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        queued_at = time.perf_counter()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        wait = started_at - queued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_flight += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_run += time.perf_counter() - started_at
+            self._semaphore.release()
+
+        self.completed += 1
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": self.total_wait / finished if finished else 0.0,
+            "max_wait": self.max_wait,
+            "avg_run": self.total_run / finished if finished else 0.0,
+        }
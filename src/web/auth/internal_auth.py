@@ -0,0 +1,28 @@
+# Access to internal surfaces (/stats, /metrics), which expose counters and
+# per-route database statistics that aren't meant for players.
+
+import os
+import secrets
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+internal_scheme = HTTPBearer(auto_error=False)
+
+
+# Require 'Authorization: Bearer <INTERNAL_API_TOKEN>'. Without the variable set,
+# internal routes are disabled altogether.
+async def verify_internal_access(
+    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(internal_scheme)],
+) -> None:
+    token = os.getenv("INTERNAL_API_TOKEN")
+    if not token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    if credentials is None or not secrets.compare_digest(credentials.credentials.encode(), token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid internal API token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
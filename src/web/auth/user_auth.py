@@ -14,15 +14,27 @@ import config
 from models.auth_models import TokenDataDto
 from models.user_models import UserDto
 from modules.db import CollectionRef, UserRef
+from modules.workers import WorkerPool
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 43800  # one month
 
+# Validated users returned by get_current_user are cached for this long. Routes
+# that change a user invalidate their entry straight away, this only bounds how
+# stale writes made elsewhere can get.
+USER_CACHE_TTL = 30  # seconds
+USER_CACHE_SIZE = 10_000
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# bcrypt releases the GIL, so threads are enough by default. Configure with
+# PASSWORD_POOL_KIND (thread/process), PASSWORD_POOL_WORKERS and
+# PASSWORD_POOL_MAX_CONCURRENCY.
+password_pool = WorkerPool.from_env("password", "PASSWORD_POOL")
+
 
 def verify_password(plain_password: str | bytes, hashed_password: str | bytes) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -31,6 +43,18 @@ def verify_password(plain_password: str | bytes, hashed_password: str | bytes) -
 def get_password_hash(password: str | bytes) -> str:
     return pwd_context.hash(password)
 
+
+# Same as verify_password, but runs bcrypt in the password pool instead of
+# blocking the event loop
+async def verify_password_async(plain_password: str | bytes, hashed_password: str | bytes) -> bool:
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+
+# Same as get_password_hash, but runs bcrypt in the password pool instead of
+# blocking the event loop
+async def get_password_hash_async(password: str | bytes) -> str:
+    return await password_pool.run(get_password_hash, password)
+
 # Return database entry for user given ID
 async def get_user(id: str) -> None | UserDto:
     user_collection = await config.db.get_collection(CollectionRef.USERS)
@@ -48,7 +72,7 @@ async def authenticate_user(id: str, password: str) -> bool | UserDto:
     user = await get_user(id)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
@@ -78,10 +102,24 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> Use
         token_data = TokenDataDto(id=id)
     except InvalidTokenError:
         raise credentials_exception
-    user = await get_user(id=token_data.id)
+
+    user = config.user_cache.get(token_data.id)
     if user is None:
-        raise credentials_exception
-    return user
+        # Not cached if the user was invalidated (i.e. written) while loading.
+        generation = config.user_cache.generation
+        user = await get_user(id=token_data.id)
+        if user is None:
+            raise credentials_exception
+        config.user_cache.set(token_data.id, user, generation)
+
+    # Routes mutate the user they are given, so never hand out the cached copy.
+    return user.model_copy(deep=True)
+
+
+# Drop cached users after their database entry was changed
+def invalidate_cached_user(*ids: str) -> None:
+    if config.user_cache is not None:
+        config.user_cache.invalidate(*ids)
 
 
 async def get_current_active_user(
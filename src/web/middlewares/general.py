@@ -1,40 +1,81 @@
-import json
-
-from fastapi import Request
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import (
-    BaseHTTPMiddleware,
-    RequestResponseEndpoint,
-    _StreamingResponse,
-)
-
-
-class ResponseWrapperMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):
-        if request.url.path.startswith(("/docs", "/redoc", "/openapi.json")):
-            return await call_next(request)
-
-        response: _StreamingResponse = await call_next(request)
-
-        if request.url.path.startswith("/auth/login"):
-            return response
-
-        body = b""
-        async for chunk in response.body_iterator:
-            body += chunk
-
-        try:
-            payload = json.loads(body)
-        except json.JSONDecodeError:
-            return response
-
-        if response.status_code == 200:
-            return JSONResponse(
-                content={"status": "success", "data": payload},
-                status_code=response.status_code,
-            )
-        else:
-            return JSONResponse(
-                content={"status": "failed", "data": payload},
-                status_code=response.status_code,
-            )
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SKIPPED_PATHS = ("/docs", "/redoc", "/openapi.json", "/auth/login", "/metrics")
+
+SUCCESS_PREFIX = b'{"status":"success","data":'
+FAILED_PREFIX = b'{"status":"failed","data":'
+ENVELOPE_SUFFIX = b"}"
+
+
+class ResponseWrapperMiddleware:
+    """
+    Wraps every JSON response in a `{"status": ..., "data": ...}` envelope.
+
+    This is a pure ASGI middleware: the envelope is written around the original
+    JSON bytes as they stream through, so the body is never buffered, decoded
+    or re-encoded. Responses that are not `application/json` (or are empty)
+    are passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(SKIPPED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _EnvelopeSender(send))
+
+
+class _EnvelopeSender:
+    def __init__(self, send: Send):
+        self.send = send
+        self.start: Message | None = None
+        self.wrapping = False
+        self.passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = MutableHeaders(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith("application/json"):
+                # Hold the start message until the first body chunk shows
+                # whether there is anything to wrap.
+                self.start = message
+            else:
+                self.passthrough = True
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.wrapping:
+            if not body and more_body:
+                return
+            if not body:
+                # Empty JSON body, nothing sensible to wrap.
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+
+            self.wrapping = True
+            prefix = SUCCESS_PREFIX if self.start["status"] == 200 else FAILED_PREFIX
+            headers = MutableHeaders(raw=self.start["headers"])
+            if "content-length" in headers:
+                headers["content-length"] = str(
+                    int(headers["content-length"]) + len(prefix) + len(ENVELOPE_SUFFIX)
+                )
+            await self.send(self.start)
+            body = prefix + body
+
+        if not more_body:
+            body += ENVELOPE_SUFFIX
+
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -0,0 +1,52 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from modules.db.monitoring import RouteTag, route_scope
+from modules.metrics import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, HTTP_RESPONSE_SIZE
+
+# Label of requests no route matched, so unknown paths can't blow up the number
+# of label sets.
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and response size of every HTTP request, labelled
+    by the route template (e.g. `/friendex/select/{user_id}`) rather than the
+    raw path. Pure ASGI, the body is only counted on its way through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            # Database commands issued while serving the request are attributed to its route.
+            with route_scope(RouteTag(scope=scope)):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # FastAPI stores the matched route in the scope while routing.
+            route = scope.get("route")
+            labels = (route.path if route is not None else UNMATCHED_ROUTE, scope["method"])
+            HTTP_LATENCY.observe(time.perf_counter() - start, labels)
+            HTTP_RESPONSE_SIZE.observe(size, labels)
+            HTTP_REQUESTS.inc(labels + (status,))
@@ -8,7 +8,7 @@ import config
 from models.user_models import UserDto
 from models.achievement_models import AchievementDto
 from modules.db import CollectionRef, UserRef
-from web.auth.user_auth import get_current_active_user
+from web.auth.user_auth import get_current_active_user, invalidate_cached_user
 
 _log = logging.getLogger("uvicorn")
 router = APIRouter(
@@ -80,7 +80,6 @@ async def update_achievements(
 
     current_achievements = {ach['title'] for ach in user.get("achievements", [])}
     count = len(user.get("friends", []))
-    points = user.get("points", 0)
 
     new_achievements = []
     for achievement in ACHIEVEMENTS:
@@ -98,10 +97,10 @@ async def update_achievements(
     if new_achievements:
         await collection.update_one(
             {UserRef.ID: user_id},
-            {
-                "$push": {"achievements": {"$each": new_achievements}},
-                "$set": {"points": points + sum(ach["reward"] for ach in new_achievements)}
-            }
+            {"$push": {"achievements": {"$each": new_achievements}}}
         )
+        invalidate_cached_user(user_id)
+        await config.leaderboard.refresh(user_id)
+        config.points.add(user_id, sum(ach["reward"] for ach in new_achievements))
 
     return {"message": f"{len(new_achievements)} new achievement(s)" if new_achievements else "No new Achievements"}
\ No newline at end of file
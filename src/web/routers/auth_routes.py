@@ -19,7 +19,8 @@ from web.auth.user_auth import (
     authenticate_user,
     create_access_token,
     get_current_active_user,
-    get_password_hash,
+    get_password_hash_async,
+    invalidate_cached_user,
 )
 
 
@@ -56,9 +57,10 @@ async def register_user(
             detail="User with the same name already exists",
         )
 
-    user.hashed_password = get_password_hash(password)
+    user.hashed_password = await get_password_hash_async(password)
 
     await user_collection.insert_one(user.model_dump())
+    config.leaderboard.set_user(user)
 
     _log.info(f"User {user.id} created")
 
@@ -94,8 +96,14 @@ async def delete_user(
         update = { '$set': {
             UserRef.SELECTED_FRIEND: None
         }}
-        await user_collection.update_one({ UserRef.SELECTED_FRIEND: user.id }, update )
+        tracker = await user_collection.find_one_and_update(query, update, projection={ UserRef.ID: 1 })
         deleted = await user_collection.delete_one({UserRef.ID: user.id})
+        invalidate_cached_user(user.id)
+        if tracker is not None:
+            invalidate_cached_user(tracker[UserRef.ID])
+        config.leaderboard.remove_user(user.id)
+        config.points.discard(user.id)
+        await config.mcq_cache.invalidate_user(user.id)
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,15 +1,18 @@
 # Handle passing user token after validating password hash, password resets,
 # etc.
 
+import json
 import logging
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 
 import config
 from models.user_models import UserDto
 from modules.db import CollectionRef, UserRef
-from web.auth.user_auth import get_current_active_user
+from web.auth.user_auth import get_current_active_user, invalidate_cached_user
 
 from web.routers.achievement_routes import update_achievements
 
@@ -19,6 +22,64 @@ router = APIRouter(
     tags=["users", "friendex"],
 )
 
+# Listings never need credentials or the questionnaire answers.
+LISTING_PROJECTION = {UserRef.HASHED_PASSWORD: 0, UserRef.QUESTIONS: 0}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Documents per cursor batch (and per chunk written) for the NDJSON streams.
+STREAM_BATCH_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# Keyset pagination on _id: returns up to 'limit' users matching 'id_filter'
+# whose _id sorts after 'after'. If the page is full, the last _id is set as
+# the next cursor header.
+async def _fetch_page(id_filter: dict, after: str | None, limit: int, response: Response) -> list:
+    users_collection = await config.db.get_collection(CollectionRef.USERS)
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if after is not None:
+        id_filter = {**id_filter, "$gt": after}
+
+    page = await users_collection.find(
+        {UserRef.ID: id_filter}, LISTING_PROJECTION
+    ).sort(UserRef.ID, 1).limit(limit).to_list(length=limit)
+
+    if len(page) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(page[-1][UserRef.ID])
+
+    return page
+
+
+# Streams every user matching 'id_filter' as NDJSON, one cursor batch at a time
+async def _stream_users(id_filter: dict) -> AsyncIterator[bytes]:
+    users_collection = await config.db.get_collection(CollectionRef.USERS)
+    cursor = users_collection.find(
+        {UserRef.ID: id_filter}, LISTING_PROJECTION
+    ).sort(UserRef.ID, 1).batch_size(STREAM_BATCH_SIZE)
+
+    lines = []
+    async for user in cursor:
+        lines.append(json.dumps(jsonable_encoder(user)))
+        if len(lines) >= STREAM_BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def _get_friend_ids(user_id: str) -> list[str]:
+    users_collection = await config.db.get_collection(CollectionRef.USERS)
+    user = await users_collection.find_one({UserRef.ID: user_id}, {UserRef.FRIENDS: 1})
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {user_id} not found",
+        )
+
+    return user.get(UserRef.FRIENDS, [])
+
 
 @router.get("/{user_id}")
 async def get_entry(user_id: str) -> dict:
@@ -39,19 +100,26 @@ async def get_entry(user_id: str) -> dict:
     return entry
 
 
+# Returns a page of the friends of 'user_id', ordered by ID. Pass the
+# X-Next-Cursor header of the previous page as 'after' to get the next one.
 @router.get("/friends/{user_id}")
-async def get_friends(user_id: str) -> list:
-    users_collection = await config.db.get_collection(CollectionRef.USERS)
+async def get_friends(
+    user_id: str,
+    response: Response,
+    after: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> list:
+    friends = await _get_friend_ids(user_id)
 
-    user = UserDto.model_validate(await users_collection.find_one({UserRef.ID: user_id}))
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with ID {user_id} not found",
-        )
-    friends = user.friends
+    return await _fetch_page({"$in": friends}, after, limit, response)
+
+
+# Streams every friend of 'user_id' as newline delimited JSON
+@router.get("/friends/{user_id}/stream")
+async def stream_friends(user_id: str) -> StreamingResponse:
+    friends = await _get_friend_ids(user_id)
 
-    return await users_collection.find({UserRef.ID: {"$in": friends}}).to_list()
+    return StreamingResponse(_stream_users({"$in": friends}), media_type="application/x-ndjson")
 
 
 @router.get('/select/check')
@@ -78,24 +146,27 @@ async def check_selected(
     }
 
 
+# Returns a page of the players 'user_id' is not friends with yet, ordered by
+# ID. Pass the X-Next-Cursor header of the previous page as 'after' to get the
+# next one.
 @router.get("/unmet-players/{user_id}")
-async def get_unmet_players(user_id: str) -> list:
-    user_collection = await config.db.get_collection(CollectionRef.USERS)
-    user = await user_collection.find_one({UserRef.ID: user_id})
+async def get_unmet_players(
+    user_id: str,
+    response: Response,
+    after: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> list:
+    excluded_ids = await _get_friend_ids(user_id) + [user_id]
+
+    return await _fetch_page({"$nin": excluded_ids}, after, limit, response)
 
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with ID {user_id} not found",
-        )
-    friend_ids = user.get("friends", [])
-    excluded_ids = friend_ids + [user_id]
 
-    unmet = await user_collection.find(
-        {UserRef.ID: {"$nin": excluded_ids}}
-    ).to_list()
+# Streams every player 'user_id' is not friends with yet as newline delimited JSON
+@router.get("/unmet-players/{user_id}/stream")
+async def stream_unmet_players(user_id: str) -> StreamingResponse:
+    excluded_ids = await _get_friend_ids(user_id) + [user_id]
 
-    return unmet
+    return StreamingResponse(_stream_users({"$nin": excluded_ids}), media_type="application/x-ndjson")
 
 
 @router.post("/select/{user_id}")
@@ -139,10 +210,14 @@ async def select_user(
 
     await config.tracker.remove_tracking(user.id)
     user.selected_friend = other_user.id
+    # Only the selection is written, 'user' may be stale (cached, or loaded
+    # before the await above) and writing it back would undo points awarded since.
     await users_collection.update_one(
         {UserRef.ID: user.id},
-        {"$set": user.model_dump()},
+        {"$set": {UserRef.SELECTED_FRIEND: other_user.id}},
     )
+    invalidate_cached_user(user.id)
+    config.leaderboard.update_profile(user)
 
     config.tracker.add_tracking(user.id, other_user.id)
 
@@ -199,6 +274,9 @@ async def add_friend(
             {"$set": {UserRef.FRIENDS: friend.friends}},
         )
 
+    invalidate_cached_user(user.id, friend.id)
+    config.leaderboard.update_profile(user)
+    config.leaderboard.update_profile(friend)
     await update_achievements(user.id)
 
     return {'message': 'Added friend successfully'}
@@ -20,35 +20,21 @@ router = APIRouter(
 # Returns a list with 'size' entries sorted in descending order of points out of all users in the database
 @router.get("/")
 async def get_leaderboard(size: int) -> list[PublicUserDto]:
-    collection = await config.db.get_collection(CollectionRef.USERS)
-
-    return [PublicUserDto.model_validate(data) for data in await collection.aggregate(
-        [
-            {"$sort": {UserRef.POINTS: -1, UserRef.NAME: 1}},
-            {"$limit": int(size)},
-        ]
-    ).to_list()]
+    return config.leaderboard.top(int(size))
 
 # Returns the rank (most points) of the user corresponding to 'user_id' compared with all other users
 # Rank = (# people with more points) + 1
 @router.get("/rank/{user_id}")
 async def get_rank(user_id: str) -> int:
-    collection = await config.db.get_collection(CollectionRef.USERS)
-
-    user = await collection.find_one({UserRef.ID: user_id})
-    if not user:
+    rank = config.leaderboard.rank(user_id)
+    if rank is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with ID {user_id} not found",
 
         )
-    points = user[UserRef.POINTS]
-
-    entry = await collection.aggregate([{"$match": {UserRef.POINTS: {"$gt": points}}}, {"$count": "index"}]).to_list()
 
-    if (len(entry) == 0):
-        return 1
-    return entry[0]['index'] + 1
+    return rank
 
 # UNUSED: sets points of user, no longer referred to in code
 async def set_points(
@@ -61,5 +47,7 @@ async def set_points(
         {UserRef.ID: user.id},
         {"$set": {UserRef.POINTS: points}}
     )
+    user.points = points
+    config.leaderboard.set_user(user)
 
     return {"message": "Set points successfully"}
@@ -2,10 +2,9 @@
 # etc.
 
 import logging
-import math
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 
 import config
 from models.user_models import UserDto
@@ -25,36 +24,6 @@ class LocationUserDto(PublicUserDto):
     longitude: float = -1
     is_occupied: bool = False
 
-# Returns distance between 2 (latitude, longitude) pairs in km
-def haversine(point1, point2) -> float:
-    (lat1, lon1) = point1
-    (lat2, lon2) = point2
-    # Returns the distance in km between two places with given latitudes and
-    # longitudes. Radius of the Earth in kilometers
-    R = 6371.0
-
-    # Convert latitude and longitude from degrees to radians
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-
-    # Differences in coordinates
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-
-    # Haversine formula
-    a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    # Calculate the distance
-    distance = R * c
-
-    return distance
-
 # Returns dictionary of all recent locations of all active users
 async def aggregate_locations() -> dict[tuple[float, float]]:
     # collection = await config.db.get_collection(CollectionRef.LOCATIONS)
@@ -99,7 +68,7 @@ async def upload_location(
 
 # Get all users within a 'radius' km distance to the most recent location of 'user_id'
 @router.get("/location/radius-fetch/{user_id}")
-async def fetch_radius(user_id: str, radius: float) -> list[LocationUserDto]:
+async def fetch_radius(user_id: str, radius: Annotated[float, Query(gt=0, allow_inf_nan=False)]) -> list[LocationUserDto]:
     # location_collection = await config.db.get_collection(CollectionRef.LOCATIONS)
     # user = await location_collection.find_one({LocationRef.USER: user_id})
     # if not user:
@@ -117,15 +86,10 @@ async def fetch_radius(user_id: str, radius: float) -> list[LocationUserDto]:
         )
 
     lat, long, _ = config.tracker.locations.get(user_id)
-    location_table = await aggregate_locations()
-
-    valid_ids = []
-    for table_id, table_coords in location_table.items():
-        if user_id == table_id:
-            continue
-        distance = haversine((lat, long), table_coords)
-        if distance <= radius:
-            valid_ids.append(table_id)
+    location_table = config.tracker.get_locations_within(lat, long, radius)
+    location_table.pop(user_id, None)
+
+    valid_ids = list(location_table)
 
     user_collection = await config.db.get_collection(CollectionRef.USERS)
     valid_users = [LocationUserDto.model_validate(data) async for data in user_collection.find({UserRef.ID: {"$in": valid_ids}})]
@@ -0,0 +1,20 @@
+# Prometheus scrape endpoint. Skipped by ResponseWrapperMiddleware, the body
+# must stay plain exposition text.
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from modules.metrics import REGISTRY
+from web.auth.internal_auth import verify_internal_access
+
+router = APIRouter(
+    tags=["stats"],
+    dependencies=[Depends(verify_internal_access)],
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,17 +1,14 @@
 import logging
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status, UploadFile
-from bson.binary import Binary
-from io import BytesIO
-import base64
-
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import StreamingResponse
 
-import config
 from models.user_models import UserDto
-from modules.db import CollectionRef, PictureRef
-from web.auth.user_auth import get_current_active_user
+from modules.db import PictureRef
+from modules.picture_store import decode_picture, get_picture_meta, iter_picture, select_variant, store_picture
+from modules.thumbnails import THUMBNAIL_SIZES
+from web.auth.user_auth import get_current_active_user, invalidate_cached_user
 
 _log = logging.getLogger("uvicorn")
 router = APIRouter(
@@ -19,22 +16,54 @@ router = APIRouter(
     tags=["users", "picture"],
 )
 
-# Returns string of PNG encoded in base64
+# Clients may reuse a picture for this long before revalidating it with
+# If-None-Match, which costs a 304 with no body if it hasn't changed.
+PICTURE_CACHE_MAX_AGE = 60 # seconds
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # Weak comparison, as required for If-None-Match.
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+# Returns the raw picture bytes, with ETag/If-None-Match support. Pass 'size'
+# (one of THUMBNAIL_SIZES) to get a downscaled variant instead of the original.
 @router.get("/get_picture/{user_id}")
-async def get_picture(user_id: str):
-    picture_collection = await config.db.get_collection(CollectionRef.PICTURES)
-    user = await picture_collection.find_one({ PictureRef.USER: user_id })
-    if not user:
+async def get_picture(user_id: str, request: Request, size: int | None = None):
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Size must be one of {', '.join(map(str, THUMBNAIL_SIZES))}",
+        )
+
+    meta = await get_picture_meta(user_id)
+    if not meta:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No image found for this user",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    # picture_bytes : bytes = base64.b64encode(user[PictureRef.PICTURE]).decode('utf-8')
-    # return {"image": f"data:image/png;base64,{picture_bytes}"}
-    
-    return { "image": user[PictureRef.PICTURE] }
+
+    meta = select_variant(meta, size)
+    etag = f'"{meta[PictureRef.HASH]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={PICTURE_CACHE_MAX_AGE}",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    headers["Content-Length"] = str(meta[PictureRef.LENGTH])
+    return StreamingResponse(
+        iter_picture(user_id, meta[PictureRef.HASH]),
+        media_type=meta[PictureRef.CONTENT_TYPE],
+        headers=headers,
+    )
 
 # Sets the profile picture of current authenticated user to input PNG (as string, encoded in base64)
 @router.post("/set_picture")
@@ -42,10 +71,15 @@ async def set_picture(
     user: Annotated[UserDto, Depends(get_current_active_user)],
     picture: str
 ) -> dict:
-    picture_collection = await config.db.get_collection(CollectionRef.PICTURES)
-    query = { PictureRef.USER: user.id }
-    update = { "$set": { PictureRef.PICTURE: picture } }
+    try:
+        data = decode_picture(picture)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Picture must be base64 encoded",
+        )
 
-    await picture_collection.update_one(query, update, upsert=True)
+    await store_picture(user.id, data)
+    invalidate_cached_user(user.id)
 
-    return { "message": "Uploaded picture successfully!"}
\ No newline at end of file
+    return { "message": "Uploaded picture successfully!"}
@@ -1,19 +1,18 @@
 # Handle passing user token after validating password hash, password resets,
 # etc.
-import asyncio
 from datetime import datetime, timezone
 import random
-import json
 from typing import Annotated
 
-import hashlib
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 
 import config
+from models.question_models import UserQuestionnaireMCQ
 from models.user_models import UserDto
 from modules.db import CollectionRef, UserRef
-from web.auth.user_auth import get_current_active_user
+from modules.questions.generation import QUESTIONS, MCQGenerationError, generate_mcqs, get_unique_answer_seq
+from web.auth.user_auth import get_current_active_user, invalidate_cached_user
 
 router = APIRouter(
     prefix="/questions",
@@ -21,62 +20,6 @@ router = APIRouter(
 )
 
 POINTS_PER_QUESTION = 1
-GROQ_MCQ_QUERY = """
-You need to generate four multiple choice answers for the question {question}.
-The answer to the question is {answer}.
-You are generating these questions for another person who has just met the person that this questionnaire is about, so you should ensure that the answers are something that the guessing person could guess.
-The person's name is {name}. Change the questions to be about {name} instead of second person.
-Generate three wrong answers and one correct answer.
-You will need to return a json object with the following format for example:
-```json
-{{
-    "question_text": "What is Jeremy's favourite video game?",
-    "answer_texts": [
-        {{
-            "id": 0,
-            "answer_text": "Fortnite"
-        }},
-        {{
-            "id": 1,
-            "answer_text": "Counter-Strike"
-        }},
-        {{
-            "id": 2,
-            "answer_text": "Call of Duty"
-        }},
-        {{
-            "id": 3,
-            "answer_text": "Valorant"
-        }}
-    ]
-}}
-```
-Where id is 0-indexed.
-You must put the correct answer at index {answer_index} and the wrong answers at the other indexes.
-You may make the three other wrong answers similar to the correct answer to make it harder but it must be clear that they are wrong.
-Do note include ``` code blocks in the response.
-Do note say ANYTHING ELSE in the response either, must only be the json content.
-"""
-
-# Changing the order of these questions will also change the order of the
-# question IDs... so don't change their order.
-QUESTIONS = [
-    "What course are you studying?",
-    "What's your favourite TV Show?",
-    "Do you play any sports?",
-    "Do you play any video games?",
-    "What's your type?",
-    "What's your spice tolerance?",
-    "What's your best pickup line?",
-    "What's your biggest ick?",
-    "What's a green flag you look for?",
-    "What's a red flag you avoid?",
-    "What's your love language?",
-    "What's your number 1 artist?",
-    "What's your favourite cuisine?",
-    "What's your favourite way to spend a day off?",
-    "What's your favourite unit at Monash?",
-]
 
 questions_with_id = [
     {
@@ -96,44 +39,16 @@ async def get_questions() -> list[QuestionDto]:
     return random.sample(questions_with_id, 3)
 
 
-def hash_string_to_int(_string: str) -> int:
-    """
-    Hash a string to an integer using SHA-256.
-    """
-    return int(hashlib.sha256(_string.encode()).hexdigest(), 16)
-
-def get_unique_answer_seq(id_1: str, id_2: str, unique_state: int) -> list[int]:
-    """
-    Generate a sequence 3 unique numbers from 0 to 3.
-    The sequence will be used to generate the answer options for the MCQ.
-
-    Will be consistent for the same two users.
-
-    args:
-        id_1: The UUID of the first user.
-        id_2: The UUID of the first user.
-    """
-    seed = hash_string_to_int(id_1 + id_2) + unique_state % 1000000
-    random.seed(seed)
-
-    seq = random.sample(range(4), 3)
-
-    return seq
-
-class UserQuestionnaireAnswer(BaseModel):
-    id: int
-    answerText: str
-
-class UserQuestionnaireMCQ(BaseModel):
-    id: int
-    questionText: str
-    options: list[UserQuestionnaireAnswer]
-
 @router.get("/mcq/generate/{user_id}")
 async def generate_mcq(
     user: Annotated[UserDto, Depends(get_current_active_user)],
     user_id: str
 ) -> list[UserQuestionnaireMCQ]:
+    # Usually generated in the background while the catch was in progress.
+    questions_answers = await config.mcq_prefetcher.get(user, user_id)
+    if questions_answers is not None:
+        return questions_answers
+
     user_collection = await config.db.get_collection(CollectionRef.USERS)
     other_user = UserDto.model_validate(await user_collection.find_one({UserRef.ID: user_id}))
     
@@ -142,75 +57,14 @@ async def generate_mcq(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with ID {user_id} not found",
         )
-    
-    answer_seq = get_unique_answer_seq(
-        user.id,
-        other_user.id,
-        user.questions_answered
-    )
-
-    # Generate prompts for Groq.
-    groq_prompts = []
-    question_ids = []
-    for i, question in enumerate(other_user.questions):
-        id = question.id
-        question_text = QUESTIONS[id]
-        answer_text = question.answer
 
-        question_ids.append(id)
-        groq_prompts.append(
-            {
-                "role": "user",
-                "content": GROQ_MCQ_QUERY.format(
-                    question=question_text,
-                    answer=answer_text,
-                    answer_index=answer_seq[i],
-                    name=other_user.name,
-                ),
-            }
-        )
-
-    # Feed that shit to Groq.
-    tasks = [config.groq.chat.completions.create(
-        messages=[prompt],
-        model="gemma2-9b-it",
-    ) for prompt in groq_prompts]
-    responses = await asyncio.gather(*tasks)
-
-    # Now parse Groq's responses.
-    questions_answers = []
-    for id, groq_response in zip(question_ids, responses):
-        if not groq_response.choices[0]:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to generate MCQ from Groq.",
-            )
-        
-        try:
-            options = json.loads(groq_response.choices[0].message.content)
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to parse MCQ from Groq.",
-            ) from e
-
-        question_text = options["question_text"]
-
-        questions_answers.append(
-            UserQuestionnaireMCQ(
-                id=id,
-                questionText=question_text,
-                options=[
-                    UserQuestionnaireAnswer(
-                        id=option["id"],
-                        answerText=option["answer_text"],
-                    )
-                    for option in options["answer_texts"]
-                ],
-            )
-        )
-
-    return questions_answers
+    try:
+        return await generate_mcqs(user, other_user)
+    except MCQGenerationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e),
+        ) from e
 
 # Validates the answers from the current authenticated user to the questions of the user corresponding to
 # 'user_id'
@@ -241,23 +95,32 @@ async def validate_mcq(
             correct_count += 1
 
     user.questions_answered += 1
-    user.points += correct_count
+    # Only the fields changed here are written: 'user' may come from the cache
+    # and 'other_user' was read before the awaits below, writing either back
+    # would undo concurrent changes (achievements, friends, selection). Points
+    # go through the points buffer.
+    update = {"$inc": {UserRef.QUESTIONS_ANSWERED: 1}}
 
     if other_user.previous_question_answered_at:
         if correct_count == 3 and (datetime.now(timezone.utc) - other_user.previous_question_answered_at.replace(tzinfo=timezone.utc)).total_seconds() < 60 * 10:
-            user.friends.append(other_user.id)
-            other_user.friends.append(user.id)
+            if other_user.id not in user.friends:
+                user.friends.append(other_user.id)
+            if user.id not in other_user.friends:
+                other_user.friends.append(user.id)
+            update["$addToSet"] = {UserRef.FRIENDS: other_user.id}
             await user_collection.update_one(
                 {UserRef.ID: other_user.id},
-                {"$set": other_user.model_dump()},
+                {"$addToSet": {UserRef.FRIENDS: user.id}},
             )
+            config.leaderboard.update_profile(other_user)
 
     if correct_count == 3:
         user.previous_question_answered_at = datetime.now(timezone.utc)
+        update["$set"] = {UserRef.PREVIOUS_QUESTION_ANSWERED_AT: user.previous_question_answered_at}
 
-    await user_collection.update_one(
-        {UserRef.ID: user.id},
-        {"$set": user.model_dump()},
-    )
+    await user_collection.update_one({UserRef.ID: user.id}, update)
+    invalidate_cached_user(user.id, other_user.id)
+    config.leaderboard.update_profile(user)
+    config.points.add(user.id, correct_count)
 
     return {"correctCount": correct_count, "pointsAwarded": correct_count * POINTS_PER_QUESTION}
@@ -0,0 +1,67 @@
+# Internal counters of in-process caches and worker pools.
+
+import logging
+
+from fastapi import APIRouter, Depends
+
+import config
+from modules.picture_store import thumbnail_pool
+from modules.questions.generation import mcq_client
+from web.auth.internal_auth import verify_internal_access
+from web.auth.user_auth import password_pool
+
+_log = logging.getLogger("uvicorn")
+router = APIRouter(
+    prefix="/stats",
+    tags=["stats"],
+    dependencies=[Depends(verify_internal_access)],
+)
+
+
+# Returns hit/miss counters of the in-process caches
+@router.get("/caches")
+async def get_cache_stats() -> dict:
+    return {
+        "user_cache": config.user_cache.stats(),
+        "mcq_cache": config.mcq_cache.stats(),
+    }
+
+
+# Returns queueing counters of the worker pools
+@router.get("/pools")
+async def get_pool_stats() -> dict:
+    return {
+        "password": password_pool.stats(),
+        "thumbnail": thumbnail_pool.stats(),
+        "mcq_llm": mcq_client.stats(),
+    }
+
+
+# Returns database commands per route, with round trips per request / tick
+@router.get("/db")
+async def get_db_stats() -> dict:
+    if config.db.monitor is None:
+        return {"monitored": False}
+    return {"monitored": True, **config.db.monitor.stats()}
+
+
+# Returns counters of the tracker tick scheduler and the last points flush
+@router.get("/tracker")
+async def get_tracker_stats() -> dict:
+    scheduler = config.tracker.scheduler
+    return {
+        "scheduler": scheduler.stats() if scheduler is not None else None,
+        "last_flush": config.tracker.last_flush,
+    }
+
+
+# Returns counters of the write-behind points buffer
+@router.get("/points")
+async def get_points_stats() -> dict:
+    return config.points.stats()
+
+
+# Returns counters of the background MCQ generation
+@router.get("/prefetch")
+async def get_prefetch_stats() -> dict:
+    return config.mcq_prefetcher.stats()